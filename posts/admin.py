@@ -1,22 +1,150 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection
+from django.utils.functional import cached_property
 # из файла models импортируем модель Post
 from .models import Post, Group
+from . import search
+
+# С какого размера таблицы список в админке показывает оценку числа строк
+# из статистики базы, а не точный COUNT(*)
+ESTIMATE_FROM = getattr(settings, 'ADMIN_ESTIMATED_COUNT_FROM', 10000)
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы из статистики планировщика или None.
+    В SQLite статистика появляется после ANALYZE."""
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql, params = 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table]
+    elif connection.vendor == 'sqlite':
+        sql, params = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    # В sqlite_stat1 первое число в stat - число строк
+    count = int(str(row[0]).split()[0])
+    return count if count >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Для списка без фильтров берёт число строк из оценки: точный COUNT(*)
+    по большой таблице дороже самой страницы. С фильтрами считает точно."""
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATE_FROM:
+                return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.ListFilter):
+    """Фильтр по внешнему ключу с полем автодополнения вместо ссылки на
+    каждую связанную запись. Варианты подгружает autocomplete-view админки
+    связанной модели, поэтому у неё должны быть search_fields."""
+
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        self.title = field.verbose_name
+        super().__init__(request, params, model, model_admin)
+        self.parameter_name = '%s__id__exact' % self.field_name
+        value = params.pop(self.parameter_name, None)
+        if value is not None:
+            self.used_parameters[self.parameter_name] = value
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(), required=False,
+            widget=AutocompleteSelect(field.remote_field, model_admin.admin_site))
+
+    def has_output(self):
+        return True
+
+    def value(self):
+        return self.used_parameters.get(self.parameter_name)
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: int(self.value())})
+        except ValueError as error:
+            raise IncorrectLookupParameters(error)
+
+    def choices(self, changelist):
+        # Остальные параметры списка уходят с формой фильтра скрытыми полями
+        yield {
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items()
+                if name != self.parameter_name
+            ],
+            'reset_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'widget': self.form_field.widget.render(
+                self.parameter_name, self.value(),
+                attrs={'id': 'filter_%s' % self.field_name, 'onchange': 'this.form.submit()'}),
+        }
+
+
+class AuthorFilter(AutocompleteFilter):
+    field_name = 'author'
+
+
+class GroupFilter(AutocompleteFilter):
+    field_name = 'group'
 
 
 class PostAdmin(admin.ModelAdmin):
     # перечисляем поля, которые должны отображаться в админке
-    list_display = ("text", "pub_date", "author")
+    list_display = ("text", "pub_date", "author", "group")
+    # автор и группа - тем же запросом, что и страница списка
+    list_select_related = ("author", "group")
     # добавляем интерфейс для поиска по тексту постов
     search_fields = ("text",)
-    # добавляем возможность фильтрации по дате
-    list_filter = ("pub_date",)
+    # навигация по датам идёт по индексу (pub_date, id)
+    date_hierarchy = "pub_date"
+    ordering = ("-pub_date", "-id")
+    # фильтр по дате - несколько диапазонов по тому же индексу,
+    # автор и группа выбираются автодополнением, а не списком ссылок
+    list_filter = ("pub_date", AuthorFilter, GroupFilter)
+    autocomplete_fields = ("author", "group")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(Post.author.field.remote_field, self.admin_site).media
+
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по индексу FTS5 вместо LIKE '%...%' по всей таблице
+        match = search.matching_ids(search_term) if search.available() else None
+        if match is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=match), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ("title", "description", "slug")
-    search_fields = ("title", "description",)
-    list_filter = ("slug",)
+    search_fields = ("title", "slug", "description",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = "-пусто-"
 
 
@@ -0,0 +1,175 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from . import caching, feed
+from .models import Comment, Group, Post, User
+from .pagination import CursorPaginator, InvalidCursor
+from .views import group_scopes, index_scopes, profile_scopes
+
+# Только чтение. Ответы собираются из словарей .values() без создания
+# моделей Post и User и без шаблонов.
+
+PAGE_SIZE = getattr(settings, 'API_PAGE_SIZE', 20)
+MAX_PAGE_SIZE = 100
+
+# Имя поля в ответе -> поле для .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'image_width': 'image_width',
+    'image_height': 'image_height',
+    'comment_count': 'comment_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'created': 'created',
+    'author': 'author__username',
+}
+# Поля ключа сортировки выбираются всегда, даже если их не просили
+POST_KEY = ('pub_date', 'id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """Только GET/HEAD; ApiError превращается в JSON с нужным статусом."""
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+    return wrapper
+
+
+def requested_fields(request, available, parameter='fields'):
+    """Поля из ?fields=id,text,author; без параметра - все."""
+    raw = request.GET.get(parameter)
+    if not raw:
+        return list(available)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError('Неизвестные поля: %s' % ', '.join(unknown))
+    return names
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def lookups(fields, available, key=()):
+    # Поля для .values(): запрошенные и ключ сортировки, без повторов
+    return list(dict.fromkeys([available[name] for name in fields] + list(key)))
+
+
+def serialize(row, fields, available):
+    item = {name: row[available[name]] for name in fields}
+    if 'image' in item:
+        item['image'] = _image_url(item['image'])
+    return item
+
+
+def _image_url(name):
+    return Post._meta.get_field('image').storage.url(name) if name else None
+
+
+def paginated(request, paginator, fields, available, cursor_parameter='cursor'):
+    try:
+        page = paginator.page(request.GET.get(cursor_parameter) or None)
+    except InvalidCursor:
+        raise ApiError('Неверный курсор')
+    return {
+        'results': [serialize(row, fields, available) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def post_list(request, posts):
+    fields = requested_fields(request, POST_FIELDS)
+    rows = posts.values(*lookups(fields, POST_FIELDS, POST_KEY))
+    return JsonResponse(paginated(request, CursorPaginator(rows, page_size(request)), fields, POST_FIELDS))
+
+
+@api_view
+@caching.conditional_page(index_scopes)
+def index(request):
+    return post_list(request, Post.objects.all())
+
+
+@api_view
+@caching.conditional_page(group_scopes)
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list('id', flat=True).first()
+    if group_id is None:
+        raise ApiError('Группа не найдена', status=404)
+    return post_list(request, Post.objects.filter(group_id=group_id))
+
+
+@api_view
+@caching.conditional_page(profile_scopes)
+def profile(request, username):
+    author_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if author_id is None:
+        raise ApiError('Пользователь не найден', status=404)
+    return post_list(request, Post.objects.filter(author_id=author_id))
+
+
+@api_view
+def follow_index(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти', status=401)
+    fields = requested_fields(request, POST_FIELDS)
+    paginator = feed.follow_paginator(
+        request.user, page_size(request), values=lookups(fields, POST_FIELDS, POST_KEY))
+    return JsonResponse(paginated(request, paginator, fields, POST_FIELDS))
+
+
+def post_detail_scopes(request, post_id):
+    post = Post.objects.filter(id=post_id).values('group_id').first()
+    if post is None:
+        return None
+    scopes = [caching.post_scope(post_id)]
+    if post['group_id'] is not None:
+        # В ответе есть slug группы: переименование должно сменить ETag
+        scopes.append(caching.group_scope(post['group_id']))
+    return scopes
+
+
+@api_view
+@caching.conditional_page(post_detail_scopes)
+def post_detail(request, post_id):
+    """Пост и первая (или ?cursor=) страница комментариев к нему, от старых
+    к новым. Поля поста - ?fields=, комментариев - ?comment_fields=."""
+    fields = requested_fields(request, POST_FIELDS)
+    comment_fields = requested_fields(request, COMMENT_FIELDS, 'comment_fields')
+    row = Post.objects.filter(id=post_id).values(*lookups(fields, POST_FIELDS)).first()
+    if row is None:
+        raise ApiError('Пост не найден', status=404)
+    comments = Comment.objects.filter(post_id=post_id).values(
+        *lookups(comment_fields, COMMENT_FIELDS, COMMENT_ORDERING))
+    paginator = CursorPaginator(comments, page_size(request), ordering=COMMENT_ORDERING)
+    return JsonResponse({
+        'post': serialize(row, fields, POST_FIELDS),
+        'comments': paginated(request, paginator, comment_fields, COMMENT_FIELDS),
+    })
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from . import api
+
+app_name = "api"
+
+urlpatterns = [
+    path("posts/", api.index, name="index"),
+    path("posts/<int:post_id>/", api.post_detail, name="post"),
+    path("groups/<slug:slug>/posts/", api.group_posts, name="group_posts"),
+    path("users/<str:username>/posts/", api.profile, name="profile"),
+    path("follow/", api.follow_index, name="follow_index"),
+]
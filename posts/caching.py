@@ -0,0 +1,264 @@
+import hashlib
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from . import thumbnails
+from .models import Follow
+
+# Фрагменты лент живут долго: устаревшими их делает не таймаут, а смена
+# поколения области (scope) при записи. Разброс TTL не даёт всем ключам
+# истечь одновременно.
+FRAGMENT_TTL = getattr(settings, 'FEED_FRAGMENT_TTL', 60 * 60)
+FRAGMENT_TTL_JITTER = 0.1
+# Сколько после мягкого TTL значение ещё можно отдавать, пока его
+# пересчитывает другой процесс (см. single_flight)
+STALE_TTL = getattr(settings, 'FEED_STALE_TTL', 5 * 60)
+LOCK_TTL = 10
+LOCK_WAIT = 1.0
+LOCK_POLL = 0.05
+CARD_VERSION = 4
+
+INDEX = 'index'
+
+
+def group_scope(group_id):
+    return 'group:%s' % group_id
+
+
+def profile_scope(author_id):
+    return 'profile:%s' % author_id
+
+
+def follow_scope(user_id):
+    return 'follow:%s' % user_id
+
+
+def post_scope(post_id):
+    return 'post:%s' % post_id
+
+
+def stats_scope(user_id):
+    # Счётчики записей и подписок в боковой панели профиля и поста
+    return 'stats:%s' % user_id
+
+
+def _generation_key(scope):
+    return 'generation:%s' % scope
+
+
+def _initial_generation():
+    # Начинаем не с 1, а со времени: если ключ поколения вытеснят из кэша,
+    # новое поколение не совпадёт ни с одним из старых
+    return int(time.time() * 1000)
+
+
+def generations(*scopes):
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_generation(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def generation(scope):
+    return generations(scope)[0]
+
+
+def bump(*scopes):
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+
+
+def conditional_page(scopes_func):
+    """Условный GET для страниц, собранных из областей кэша.
+
+    ETag - хэш поколений областей, адреса, читателя и его CSRF-секрета;
+    считается без запросов к лентам и без рендера. scopes_func(request, *args, **kwargs) возвращает
+    области страницы или None, если страницы нет (тогда отвечает само
+    представление). Last-Modified такие страницы не отдают: у него точность
+    в секунду, и клиент только с If-Modified-Since получил бы 304 на
+    страницу, изменённую в ту же секунду.
+    """
+    def scopes(request, *args, **kwargs):
+        if not hasattr(request, '_conditional_scopes'):
+            request._conditional_scopes = scopes_func(request, *args, **kwargs)
+        return request._conditional_scopes
+
+    def etag(request, *args, **kwargs):
+        page_scopes = scopes(request, *args, **kwargs)
+        if not page_scopes:
+            return None
+        viewer = csrf = ''
+        if request.user.is_authenticated:
+            # В страницу для вошедшего вшит {% csrf_token %}: после входа
+            # заново секрет другой, и по старому ETag браузер остался бы
+            # с формой, которую сервер отвергнет с 403
+            viewer, csrf = request.user.id, request.META.get('CSRF_COOKIE', '')
+        parts = [viewer, csrf, request.get_full_path()] + generations(*page_scopes)
+        return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Свой Last-Modified ставят, например, ленты RSS - по дате
+            # последнего поста; ConditionalGetMiddleware ответил бы по нему 304
+            del response['Last-Modified']
+            if getattr(request, 'served_stale', False):
+                # ETag описывает текущие поколения, а в ответе старые данные
+                del response['ETag']
+            return response
+        return wrapper
+    return decorator
+
+
+def fragment_ttl():
+    return int(FRAGMENT_TTL * (1 + random.uniform(-FRAGMENT_TTL_JITTER, FRAGMENT_TTL_JITTER)))
+
+
+def single_flight(key, compute, ttl, generation=None, request=None):
+    """Значение compute() из кэша с защитой от толпы промахов.
+
+    Возвращает пару (значение, поколение, под которым оно посчитано).
+    Устаревшее значение (другое поколение или истёк мягкий TTL) пересчитывает
+    только тот, кто взял короткую блокировку в кэше, остальные пока получают
+    старое; его хранят ещё STALE_TTL секунд после мягкого TTL. Если старого
+    нет, ждут чужой результат не дольше LOCK_WAIT, а потом считают сами.
+    Значение, при расчёте которого ответ отмечен mark_incomplete, не хранится.
+    """
+    key = 'single_flight:%s' % key
+    entry = cache.get(key)
+    if entry is not None and entry['generation'] == generation and entry['refresh_at'] > time.time():
+        return entry['value'], entry['generation']
+    lock = 'lock:%s' % key
+    if cache.add(lock, 1, LOCK_TTL):
+        try:
+            value = compute()
+            if not getattr(request, 'incomplete', False):
+                cache.set(key, {
+                    'value': value,
+                    'generation': generation,
+                    'refresh_at': time.time() + ttl,
+                }, ttl + STALE_TTL)
+        finally:
+            cache.delete(lock)
+        return value, generation
+    if entry is not None:
+        return entry['value'], entry['generation']
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry['generation'] == generation:
+            return entry['value'], entry['generation']
+    return compute(), generation
+
+
+def mark_stale(request):
+    # Такой ответ нельзя класть в кэш страниц и отдавать с ETag текущих поколений
+    if request is not None:
+        request.served_stale = True
+
+
+def mark_incomplete(request):
+    # В ответе временная замена (картинка без части миниатюр): ни его,
+    # ни собранные для него фрагменты кэшировать нельзя
+    mark_stale(request)
+    if request is not None:
+        request.incomplete = True
+
+
+def feed_page(request, paginator, scope):
+    """Страница ленты области scope через single_flight: после записи
+    в область запрос повторяет один процесс, а не все одновременно.
+    Возвращает страницу и поколение, под которым её стоит кэшировать."""
+    cursor = request.GET.get('cursor') or ''
+    current = generation(scope)
+    key = 'feed_page:%s:%s' % (scope, hashlib.md5(cursor.encode()).hexdigest())
+    page, page_generation = single_flight(
+        key, lambda: paginator.get_page(cursor or None), fragment_ttl(), current)
+    if page_generation != current:
+        mark_stale(request)
+    return page, page_generation
+
+
+def follow_generation(user):
+    """Версия ленты подписок: меняется при подписке/отписке пользователя
+    и при любой записи в профилях авторов, на которых он подписан."""
+    author_ids = Follow.objects.filter(user=user).values_list('author_id', flat=True)
+    scopes = [follow_scope(user.id)] + [profile_scope(author_id) for author_id in author_ids]
+    versions = ':'.join(str(version) for version in generations(*scopes))
+    return hashlib.md5(versions.encode()).hexdigest()
+
+
+def add_surrogate_keys(request, *scopes):
+    """Отмечает области, из которых собран ответ, вместе с их текущими
+    поколениями. Вызывать до чтения данных из базы: запись, случившаяся
+    во время рендера, тогда сделает сохранённую страницу устаревшей,
+    а не закрепит старые данные под новым поколением."""
+    keys = getattr(request, 'surrogate_keys', {})
+    missing = [scope for scope in scopes if scope not in keys]
+    if missing:
+        keys.update(zip(missing, generations(*missing)))
+    request.surrogate_keys = keys
+
+
+def post_scopes(post):
+    scopes = [INDEX, post_scope(post.id), profile_scope(post.author_id)]
+    for group_id in (post.group_id, getattr(post, '_previous_group_id', None)):
+        if group_id is not None:
+            scopes.append(group_scope(group_id))
+    return scopes
+
+
+def post_card_key(post):
+    # Версия карточки - хэш всего, что в ней видно: правка текста, смена
+    # группы или картинки, новый комментарий дают новый ключ, а старый
+    # просто истекает. CARD_VERSION меняют при правке post_card.html.
+    group = post.group
+    parts = [
+        CARD_VERSION, post.text, post.image.name or '', post.comment_count, post.author.username,
+        group.slug if group else '', group.title if group else '',
+    ]
+    digest = hashlib.md5('\x1f'.join(str(part) for part in parts).encode()).hexdigest()
+    return 'post_card:%s:%s' % (post.id, digest)
+
+
+def post_cards(posts, request=None):
+    """HTML карточек для страницы ленты: один get_many на всю страницу,
+    рендерятся только промахи. Карточки с картинкой, у которой нарезаны
+    ещё не все миниатюры, не сохраняются."""
+    keys = [post_card_key(post) for post in posts]
+    found = cache.get_many(keys)
+    missing = [post for post, key in zip(posts, keys) if key not in found]
+    # Миниатюры для всех перерисовываемых карточек - одним обращением
+    pictures = thumbnails.pictures(post.image for post in missing)
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        if key not in found:
+            picture = pictures.get(post.image.name)
+            found[key] = render_to_string('posts/post_card.html', {'post': post, 'picture': picture})
+            if picture is None or picture.complete:
+                rendered[key] = found[key]
+            else:
+                mark_incomplete(request)
+        cards.append(mark_safe(found[key]))
+    if rendered:
+        cache.set_many(rendered, fragment_ttl())
+    return cards
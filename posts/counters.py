@@ -0,0 +1,89 @@
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+
+# Все изменения счётчиков - атомарные UPDATE ... SET x = x + 1, их вызывают
+# внутри той же транзакции, что создаёт или удаляет саму запись.
+# Расхождения (удаления из админки, каскады) чинит команда reconcile_counters.
+
+
+def _bump(user_id, field, delta):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        # Счётчик, уже разошедшийся с реальностью, не уводим в минус
+        stats.filter(**{field + '__gte': -delta}).update(**{field: F(field) + delta})
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**{field: F(field) + delta})
+
+
+def stats_for(user):
+    """Счётчики пользователя без записи в базу на GET-запросе."""
+    return UserStats.objects.filter(user=user).first() or UserStats(user=user)
+
+
+def post_created(post):
+    _bump(post.author_id, 'posts_count', 1)
+
+
+def comment_created(comment):
+    Post.objects.filter(pk=comment.post_id).update(comment_count=F('comment_count') + 1)
+
+
+def follow_created(user, author):
+    _bump(user.id, 'following_count', 1)
+    _bump(author.id, 'followers_count', 1)
+
+
+def follow_deleted(user, author):
+    _bump(user.id, 'following_count', -1)
+    _bump(author.id, 'followers_count', -1)
+
+
+def _in_range(field, id_range):
+    # __range не поддерживается для внешних ключей в Django 2.2
+    return {field + '__gte': id_range[0], field + '__lte': id_range[1]}
+
+
+def _actual(queryset, field, id_range):
+    rows = (
+        queryset.filter(**_in_range(field, id_range)).order_by()
+        .values_list(field).annotate(total=Count('id'))
+    )
+    return dict(rows)
+
+
+def reconcile_posts(id_range):
+    """Сверяет comment_count постов с id в диапазоне; возвращает число исправленных."""
+    actual = _actual(Comment.objects, 'post_id', id_range)
+    fixed = 0
+    stored = Post.objects.filter(id__range=id_range).values_list('id', 'comment_count')
+    for post_id, comment_count in stored:
+        if actual.get(post_id, 0) != comment_count:
+            Post.objects.filter(pk=post_id).update(comment_count=actual.get(post_id, 0))
+            fixed += 1
+    return fixed
+
+
+def reconcile_users(id_range):
+    """Сверяет счётчики пользователей с id в диапазоне; возвращает число исправленных."""
+    posts = _actual(Post.objects, 'author_id', id_range)
+    followers = _actual(Follow.objects, 'author_id', id_range)
+    following = _actual(Follow.objects, 'user_id', id_range)
+    stats = {item.user_id: item for item in UserStats.objects.filter(**_in_range('user_id', id_range))}
+    fixed = 0
+    for user_id in User.objects.filter(id__range=id_range).values_list('id', flat=True):
+        expected = {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        current = stats.get(user_id)
+        if current is None:
+            UserStats.objects.create(user_id=user_id, **expected)
+            fixed += 1
+        elif any(getattr(current, name) != value for name, value in expected.items()):
+            UserStats.objects.filter(pk=current.pk).update(**expected)
+            fixed += 1
+    return fixed
@@ -0,0 +1,99 @@
+import json
+import time
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Post
+
+# Сколько строк за раз забирает .iterator(): в памяти - только эта пачка
+CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def records(user):
+    """Все данные пользователя записями в формате команды import_jsonl:
+    посты, комментарии, подписки."""
+    posts = (
+        Post.objects.filter(author=user).order_by('id')
+        .values('id', 'text', 'pub_date', 'group__slug', 'image', 'image_width', 'image_height')
+    )
+    for post in posts.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'type': 'post', 'id': post['id'], 'author': user.username, 'text': post['text'],
+            'pub_date': post['pub_date'], 'group': post['group__slug'], 'image': post['image'] or None,
+            'image_width': post['image_width'], 'image_height': post['image_height'],
+        }
+    comments = Comment.objects.filter(author=user).order_by('id').values('id', 'post_id', 'text', 'created')
+    for comment in comments.iterator(chunk_size=CHUNK_SIZE):
+        yield {
+            'type': 'comment', 'id': comment['id'], 'post': comment['post_id'], 'author': user.username,
+            'text': comment['text'], 'created': comment['created'],
+        }
+    authors = Follow.objects.filter(user=user).order_by('id').values_list('author__username', flat=True)
+    for author in authors.iterator(chunk_size=CHUNK_SIZE):
+        yield {'type': 'follow', 'user': user.username, 'author': author}
+
+
+def ndjson(user):
+    for record in records(user):
+        yield (json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode()
+
+
+class _Pipe:
+    """Файл только на запись для zipfile: копит записанное, пока генератор
+    архива не заберёт его. Без seek и tell zipfile пишет архив
+    последовательно, с дескрипторами данных после каждого файла."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_archive(user):
+    """Zip-архив, собираемый на лету: data.ndjson и файлы картинок постов
+    из хранилища. Каждая картинка попадает в архив один раз."""
+    return (chunk for chunk in _zip_chunks(user) if chunk)
+
+
+def _zip_chunks(user):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w') as archive:
+        with archive.open(_entry('data.ndjson', zipfile.ZIP_DEFLATED), 'w', force_zip64=True) as data:
+            for line in ndjson(user):
+                data.write(line)
+                yield pipe.drain()
+        storage = Post._meta.get_field('image').storage
+        # Одинаковые картинки хранятся одним файлом (posts/storage.py):
+        # повторы отсекает DISTINCT в базе, а не множество имён в памяти
+        names = (
+            Post.objects.filter(author=user).exclude(image='').order_by('image')
+            .values_list('image', flat=True).distinct()
+        )
+        for name in names.iterator(chunk_size=CHUNK_SIZE):
+            if not storage.exists(name):
+                continue
+            # Картинки уже сжаты: храним как есть
+            with storage.open(name) as source, \
+                    archive.open(_entry('images/' + name, zipfile.ZIP_STORED), 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(FILE_CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    yield pipe.drain()
+    yield pipe.drain()
+
+
+def _entry(name, compress_type):
+    info = zipfile.ZipInfo(name, time.localtime()[:6])
+    info.compress_type = compress_type
+    return info
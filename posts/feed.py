@@ -0,0 +1,148 @@
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters
+from .models import FeedEntry, Follow, Post, PullAuthor
+from .pagination import CursorPaginator, MergedCursorPaginator, RawSubquery
+
+# Больше подписчиков - и посты автора не раскладываются по лентам при
+# публикации (fan-out-on-write), а подмешиваются при чтении (fan-out-on-read)
+FANOUT_LIMIT = getattr(settings, 'FEED_FANOUT_LIMIT', 1000)
+BATCH_SIZE = 1000
+
+INBOX_ORDERING = ('-pub_date', '-post_id')
+
+
+def is_pull_author(author):
+    return PullAuthor.objects.filter(author=author).exists()
+
+
+def _insert_entries(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Кладёт новый пост во входящие всех подписчиков автора."""
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list('user_id', flat=True)
+    _insert_entries(
+        FeedEntry(user_id=user_id, post_id=post.id, author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user, author):
+    """Докладывает посты автора во входящие нового подписчика."""
+    if is_pull_author(author):
+        return
+    posts = Post.objects.filter(author=author).values_list('id', 'pub_date')
+    _insert_entries(
+        FeedEntry(user_id=user.id, post_id=post_id, author_id=author.id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def clean(user, author):
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def refresh_pull_mode(author):
+    """Переводит автора на fan-out-on-read, когда подписчиков стало слишком много.
+
+    Обратно автор возвращается только командой rebuild_feeds: ей всё равно
+    придётся разложить его старые посты по лентам всех подписчиков.
+    """
+    if Follow.objects.filter(author=author).count() > FANOUT_LIMIT:
+        PullAuthor.objects.get_or_create(author=author)
+
+
+def follow(user, author):
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(user=user, author=author)
+        if created:
+            counters.follow_created(user, author)
+            refresh_pull_mode(author)
+            backfill(user, author)
+
+
+def unfollow(user, author):
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+        if deleted:
+            counters.follow_deleted(user, author)
+        clean(user, author)
+
+
+def rebuild_inbox(user):
+    with transaction.atomic():
+        FeedEntry.objects.filter(user=user).delete()
+        posts = Post.objects.filter(
+            author__following__user=user, author__pull_mode__isnull=True
+        ).values_list('id', 'author_id', 'pub_date')
+        _insert_entries(
+            FeedEntry(user_id=user.id, post_id=post_id, author_id=author_id, pub_date=pub_date)
+            for post_id, author_id, pub_date in posts.iterator()
+        )
+
+
+def follow_paginator(user, per_page, values=None):
+    """Лента подписок: входящие пользователя, слитые с постами pull-авторов.
+
+    values - поля поста для .values(): тогда элементы страницы - словари,
+    а не модели (см. posts/api.py); среди полей должны быть pub_date и id.
+    """
+    if values is None:
+        inbox = CursorPaginator(
+            FeedEntry.objects.for_feed().filter(user=user), per_page,
+            ordering=INBOX_ORDERING, transform=attrgetter('post'), key_fields=('pub_date', 'id'))
+        posts = Post.objects.for_feed()
+    else:
+        inbox = CursorPaginator(
+            FeedEntry.objects.filter(user=user).values(*['post__' + name for name in values]), per_page,
+            ordering=INBOX_ORDERING, transform=_strip_post_prefix, key_fields=('pub_date', 'id'))
+        posts = Post.objects.values(*values)
+    pull_authors = PullAuthor.objects.filter(author__following__user=user).values_list('author_id', flat=True)
+    return MergedCursorPaginator([inbox, PullAuthorsPaginator(posts, pull_authors, per_page)], per_page)
+
+
+def _strip_post_prefix(row):
+    return {name[len('post__'):]: value for name, value in row.items()}
+
+
+class PullAuthorsPaginator(CursorPaginator):
+    """Посты pull-авторов, на которых подписан читатель, одним запросом.
+
+    Каждый автор - ветка UNION ALL: поиск по индексу (author, pub_date, id)
+    с LIMIT. Сортировать остаётся не больше N * (per_page + 1) строк, а не
+    все посты авторов, и число запросов не растёт с числом авторов.
+    """
+
+    def __init__(self, posts, authors, per_page):
+        super().__init__(posts, per_page)
+        self.authors = authors
+
+    def query(self, values, forward):
+        author_ids = list(self.authors)
+        if not author_ids:
+            return self.object_list.none()
+        ordering = self.ordering if forward else self._reversed_ordering()
+        legs, params = [], []
+        for number, author_id in enumerate(author_ids):
+            leg = Post.objects.filter(author_id=author_id)
+            if values is not None:
+                leg = leg.filter(self._seek(values, forward))
+            sql, leg_params = leg.values('id').order_by(*ordering)[:self.per_page + 1].query.sql_with_params()
+            legs.append('SELECT * FROM (%s) AS pull_%s' % (sql, number))
+            params.extend(leg_params)
+        ids = RawSubquery(' UNION ALL '.join(legs), params)
+        return self.object_list.filter(id__in=ids).order_by(*ordering)[:self.per_page + 1]
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.html import escape, linebreaks
+from django.utils.text import Truncator
+
+from . import caching
+from .models import Group, Post, User
+from .pagination import CursorPaginator
+
+# Сколько последних постов в документе ленты
+FEED_SIZE = getattr(settings, 'SYNDICATION_FEED_SIZE', 20)
+
+
+class PostFeed(Feed):
+    """Последние посты в RSS. Документ собирается одной страницей того же
+    keyset-паджинатора, что и HTML-лента; кэш и 304 - в caching.conditional_page
+    и AnonymousPageCacheMiddleware по областям, отмеченным в get_object."""
+
+    def items(self, obj):
+        return CursorPaginator(self.posts(obj), FEED_SIZE).page().object_list
+
+    def item_title(self, post):
+        return Truncator(post.text).words(10)
+
+    def item_description(self, post):
+        return linebreaks(escape(post.text))
+
+    def item_link(self, post):
+        return reverse('post', args=[post.author.username, post.id])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class GroupFeed(PostFeed):
+
+    def get_object(self, request, slug):
+        group = get_object_or_404(Group, slug=slug)
+        caching.add_surrogate_keys(request, caching.group_scope(group.id))
+        return group
+
+    def posts(self, group):
+        return Post.objects.for_feed().filter(group=group)
+
+    def title(self, group):
+        return 'Yatube: %s' % group.title
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('group_posts', args=[group.slug])
+
+
+class AuthorFeed(PostFeed):
+
+    def get_object(self, request, username):
+        author = get_object_or_404(User, username=username)
+        caching.add_surrogate_keys(request, caching.profile_scope(author.id))
+        return author
+
+    def posts(self, author):
+        return Post.objects.for_feed().filter(author=author)
+
+    def title(self, author):
+        return 'Yatube: @%s' % author.username
+
+    def description(self, author):
+        return 'Записи %s' % (author.get_full_name() or author.username)
+
+    def link(self, author):
+        return reverse('profile', args=[author.username])
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupFeed.description
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+    subtitle = AuthorFeed.description
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from .models import Post, Comment
+from . import images
 
 
 class PostForm(forms.ModelForm):
@@ -7,6 +9,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['group', 'text', 'image']
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Нормализуем только новую загрузку, а не уже сохранённую картинку
+        if isinstance(image, UploadedFile):
+            image = images.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,66 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Больше этого по стороне картинку не храним: шире всех миниатюр
+# (posts/thumbnails.py) с запасом на будущие размеры
+MAX_SIDE = getattr(settings, 'POST_IMAGE_MAX_SIDE', 2048)
+# Столько пикселей готовы раскодировать; больше - отказ по заголовку,
+# без декодирования
+MAX_PIXELS = getattr(settings, 'POST_IMAGE_MAX_PIXELS', 50 * 1000 * 1000)
+JPEG_QUALITY = getattr(settings, 'POST_IMAGE_JPEG_QUALITY', 85)
+BACKGROUND = (255, 255, 255)
+
+
+def normalize(upload):
+    """Приводит загруженную картинку к виду, в котором её хранить.
+
+    Размеры проверяются по заголовку до декодирования; файл, который не
+    удалось раскодировать, - ошибка формы invalid_image. Затем картинка
+    поворачивается по EXIF, уменьшается до MAX_SIDE по большей стороне
+    и пересохраняется прогрессивным JPEG без метаданных (ICC-профиль
+    оставляем, чтобы не поплыли цвета). Прозрачность заливается белым.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > MAX_PIXELS:
+            raise ValidationError(
+                'Изображение слишком большое: %(width)s×%(height)s пикселей.',
+                code='too_many_pixels', params={'width': width, 'height': height})
+        if max(width, height) > MAX_SIDE:
+            # JPEG умеет декодироваться сразу с уменьшением в 2, 4 или 8 раз
+            image.draft('RGB', (MAX_SIDE, MAX_SIDE))
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+        image = _flatten(image)
+
+        output = io.BytesIO()
+        options = {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        image.save(output, 'JPEG', **options)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        # Заголовок прочитался, а данные обрезаны или битые: Pillow падает
+        # только при декодировании, и без этого вышла бы ошибка 500
+        raise ValidationError(
+            'Загрузите правильное изображение: файл повреждён или обрезан.', code='invalid_image') from error
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    return SimpleUploadedFile(name, output.getvalue(), content_type='image/jpeg')
+
+
+def _flatten(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, BACKGROUND)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
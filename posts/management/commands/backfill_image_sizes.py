@@ -0,0 +1,47 @@
+from django.core.files.images import get_image_dimensions
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Записывает размеры картинок постов, загруженных до появления image_width/image_height'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = Post.objects.exclude(image='').filter(image_width__isnull=True).order_by('id')
+        filled = skipped = 0
+        last_id = 0
+        while True:
+            # Идём по id, а не по смещению: заполненные строки выпадают из выборки
+            batch = list(pending.filter(id__gt=last_id).only('id', 'image')[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            sized = []
+            for post in batch:
+                size = self.read_size(post)
+                if size is None:
+                    skipped += 1
+                    continue
+                post.image_width, post.image_height = size
+                sized.append(post)
+            Post.objects.bulk_update(sized, ['image_width', 'image_height'])
+            filled += len(sized)
+        self.stdout.write(self.style.SUCCESS(f'Записаны размеры: {filled}, пропущено: {skipped}'))
+
+    def read_size(self, post):
+        # get_image_dimensions читает только заголовок файла, а не всю картинку
+        try:
+            with post.image.storage.open(post.image.name) as image:
+                width, height = get_image_dimensions(image)
+        except OSError as error:
+            self.stderr.write(f'Пост {post.id}: {error}')
+            return None
+        if not width or not height:
+            self.stderr.write(f'Пост {post.id}: не удалось прочитать размеры {post.image.name}')
+            return None
+        return width, height
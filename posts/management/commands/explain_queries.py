@@ -0,0 +1,70 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import feed
+from posts.models import Comment, Follow, Group, Post, User
+from posts.pagination import CursorPaginator
+from posts.views import CommentsPaginator
+
+# Полный проход таблицы (SCAN без индекса) или сортировка во временном B-дереве
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+$|USE TEMP B-TREE', re.MULTILINE)
+# У pull-авторов сортируются не таблица, а ветки UNION ALL, каждая уже
+# ограничена LIMIT (feed.PullAuthorsPaginator): такой проход и сортировка допустимы
+BOUNDED_SORT = re.compile(r'\bSCAN pull_\d+$|USE TEMP B-TREE FOR ORDER BY', re.MULTILINE)
+BOUNDED_SORT_QUERIES = ('follow_index: pull-авторы',)
+
+
+def paginated(name, paginator):
+    """Первая страница ленты и страницы после и до курсора."""
+    seek = (timezone.now(), 1)
+    return [
+        (name, paginator.query(None, forward=True)),
+        (name + ' (курсор)', paginator.query(seek, forward=True)),
+        (name + ' (назад)', paginator.query(seek, forward=False)),
+    ]
+
+
+def view_queries():
+    # Пользователь и пост не сохраняются: для плана нужны только значения фильтров
+    user = User(id=1, username='username')
+    queries = [
+        ('group_posts: группа', Group.objects.filter(slug='slug')),
+        ('profile: автор', User.objects.filter(username='username')),
+        ('profile: подписка', Follow.objects.filter(user=user, author=user)),
+        ('post_view: пост', Post.objects.filter(author__username='username', id=1)),
+    ]
+    queries += paginated(
+        'post_view: комментарии', CommentsPaginator(Comment.objects.filter(post_id=1).select_related('author')))
+    queries += paginated('index', CursorPaginator(Post.objects.for_feed(), 10))
+    queries += paginated('group_posts', CursorPaginator(Post.objects.for_feed().filter(group_id=1), 10))
+    queries += paginated('profile', CursorPaginator(Post.objects.for_feed().filter(author=user), 10))
+    inbox = feed.follow_paginator(user, 10).paginators[0]
+    queries += paginated('follow_index: входящие', inbox)
+    # Авторы не читаются из базы: план зависит только от их числа
+    queries += paginated('follow_index: pull-авторы', feed.PullAuthorsPaginator(Post.objects.for_feed(), [1, 2], 10))
+    return queries
+
+
+class Command(BaseCommand):
+    help = 'Печатает EXPLAIN QUERY PLAN для запросов представлений posts и ищет полные проходы таблиц'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если какой-то запрос проходит таблицу целиком')
+
+    def handle(self, *args, **options):
+        offenders = []
+        for name, queryset in view_queries():
+            plan = queryset.explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            checked = BOUNDED_SORT.sub('', plan) if name.startswith(BOUNDED_SORT_QUERIES) else plan
+            if FULL_SCAN.search(checked):
+                offenders.append(name)
+        if offenders and options['check']:
+            raise CommandError('Полный проход таблицы: ' + ', '.join(offenders))
+        if offenders:
+            self.stdout.write(self.style.WARNING('Полный проход таблицы: ' + ', '.join(offenders)))
@@ -0,0 +1,47 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Удаляет картинки постов, на которые не ссылается ни один пост, вместе с их миниатюрами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их пост может быть ещё не сохранён')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        # Число ссылок на каждый файл: один файл может принадлежать многим постам
+        references = dict(
+            Post.objects.exclude(image='').order_by().values_list('image').annotate(total=Count('id')))
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = kept = 0
+        for name in self.walk(storage, field.upload_to.rstrip('/')):
+            if references.get(name) or storage.get_modified_time(name) > cutoff:
+                kept += 1
+                continue
+            removed += 1
+            self.stdout.write(name)
+            if not options['dry_run']:
+                # Сначала миниатюры из хранилища ключей sorl-thumbnail, потом сам файл
+                default.kvstore.delete(ImageFile(name, storage))
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {removed}, осталось: {kept}'))
+
+    def walk(self, storage, path):
+        directories, files = storage.listdir(path)
+        for filename in files:
+            yield posixpath.join(path, filename)
+        for directory in directories:
+            yield from self.walk(storage, posixpath.join(path, directory))
@@ -0,0 +1,218 @@
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from posts import caching
+from posts.models import Comment, Follow, Group, Post, User
+
+KINDS = ('post', 'comment', 'follow')
+
+
+@contextmanager
+def keep_dates(*fields):
+    # bulk_create проставляет auto_now_add текущим временем, а даты
+    # должны остаться исходными
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def read_records(path, offset):
+    """Записи файла JSONL начиная с байта offset: (смещение после строки,
+    номер строки в этом проходе, запись). Файл читается построчно, в памяти
+    только текущая строка."""
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        for number, line in enumerate(file, 1):
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise ValueError(f'строка {number}: {error}')
+            yield offset, number, record
+
+
+def parse_date(value):
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'дата {value!r}')
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL: по записи в строке, '
+        '{"type": "post" | "comment" | "follow", ...}. Пользователи и группы '
+        'должны уже быть в базе (ищутся по username и slug).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одном INSERT')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Строк в одной транзакции')
+        parser.add_argument(
+            '--checkpoint', help='Файл со смещением последней закоммиченной строки (по умолчанию PATH.checkpoint)')
+        parser.add_argument('--restart', action='store_true', help='Начать с начала файла, а не с контрольной точки')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.batch_size = options['batch_size']
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        offset = 0
+        if not options['restart'] and os.path.exists(checkpoint):
+            with open(checkpoint) as file:
+                offset = int(file.read() or 0)
+            self.stdout.write(f'Продолжаем с байта {offset}')
+        # username и slug -> id: пользователей и групп на порядки меньше, чем
+        # постов, поэтому держим их в памяти и не ходим за ними в базу
+        self.user_ids = dict(User.objects.values_list('username', 'id'))
+        self.group_ids = dict(Group.objects.values_list('slug', 'id'))
+        self.imported = dict.fromkeys(KINDS, 0)
+        self.skipped = 0
+        self.duplicates = 0
+
+        chunk = defaultdict(list)
+        size = 0
+        try:
+            with keep_dates(Post._meta.get_field('pub_date'), Comment._meta.get_field('created')):
+                for offset, number, record in read_records(path, offset):
+                    self.add(chunk, number, record)
+                    size += 1
+                    if size >= options['chunk_size']:
+                        self.flush(chunk, offset, checkpoint)
+                        chunk, size = defaultdict(list), 0
+                self.flush(chunk, offset, checkpoint)
+        except ValueError as error:
+            raise CommandError(f'Не удалось разобрать {path}: {error}')
+        self.reset_sequences()
+        counts = ', '.join(f'{kind}: {count}' for kind, count in self.imported.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {counts}; пропущено: {self.skipped}; повторов: {self.duplicates}'))
+        self.stdout.write('Счётчики и ленты подписок пересчитайте командами reconcile_counters и rebuild_feeds.')
+
+    def add(self, chunk, number, record):
+        kind = record.get('type')
+        try:
+            if kind == 'post':
+                row = Post(
+                    id=record.get('id'), text=record['text'], pub_date=parse_date(record['pub_date']),
+                    author_id=self.user_ids[record['author']],
+                    group_id=self.group_ids[record['group']] if record.get('group') else None,
+                    image=record.get('image') or '',
+                    image_width=record.get('image_width'), image_height=record.get('image_height'))
+            elif kind == 'comment':
+                row = Comment(
+                    id=record.get('id'), post_id=record['post'], text=record['text'],
+                    created=parse_date(record['created']), author_id=self.user_ids[record['author']])
+            elif kind == 'follow':
+                row = Follow(user_id=self.user_ids[record['user']], author_id=self.user_ids[record['author']])
+            else:
+                raise KeyError('type')
+        except (KeyError, TypeError, ValueError) as error:
+            self.stderr.write(f'Строка {number} пропущена: {error!r}')
+            self.skipped += 1
+            return
+        chunk[kind].append(row)
+
+    def flush(self, chunk, offset, checkpoint):
+        """Пишет пачку одной транзакцией и только после коммита сдвигает
+        контрольную точку. Если упасть между ними, повтор пачки безопасен:
+        строки с уже занятыми id и повторные подписки пропускаются."""
+        if chunk:
+            with transaction.atomic():
+                self.drop_orphan_comments(chunk)
+                self.drop_existing(chunk)
+                for kind, model in (('post', Post), ('comment', Comment), ('follow', Follow)):
+                    model.objects.bulk_create(chunk[kind], batch_size=self.batch_size, ignore_conflicts=True)
+                    self.imported[kind] += len(chunk[kind])
+            caching.bump(*self.scopes(chunk))
+        with open(checkpoint, 'w') as file:
+            file.write(str(offset))
+
+    def drop_orphan_comments(self, chunk):
+        # Комментарий к посту, которого нет ни в базе, ни в этой пачке,
+        # сорвал бы всю транзакцию на проверке внешнего ключа
+        post_ids = {comment.post_id for comment in chunk['comment']}
+        if not post_ids:
+            return
+        known = {post.id for post in chunk['post']}
+        known.update(Post.objects.filter(id__in=post_ids - known).values_list('id', flat=True))
+        comments = []
+        for comment in chunk['comment']:
+            if comment.post_id in known:
+                comments.append(comment)
+            else:
+                self.stderr.write(f'Комментарий к посту {comment.post_id}: поста нет, пропущен')
+                self.skipped += 1
+        chunk['comment'] = comments
+
+    def drop_existing(self, chunk):
+        # Такие строки bulk_create с ignore_conflicts молча пропустил бы,
+        # а в итог они попали бы как загруженные. ignore_conflicts остаётся
+        # на случай строк, записанных в базу параллельно с импортом.
+        for kind, model in (('post', Post), ('comment', Comment)):
+            ids = {row.id for row in chunk[kind] if row.id is not None}
+            existing = self.existing_keys(model.objects.values_list('id', flat=True), 'id', ids)
+            chunk[kind] = self.unique_rows(chunk[kind], lambda row: row.id, existing)
+        users = {follow.user_id for follow in chunk['follow']}
+        existing = self.existing_keys(Follow.objects.values_list('user_id', 'author_id'), 'user_id', users)
+        chunk['follow'] = self.unique_rows(chunk['follow'], lambda row: (row.user_id, row.author_id), existing)
+
+    def existing_keys(self, queryset, field, values):
+        values = sorted(values)
+        keys = set()
+        # Пачками по batch_size: у SQLite ограничено число параметров запроса
+        for start in range(0, len(values), self.batch_size):
+            keys.update(queryset.filter(**{field + '__in': values[start:start + self.batch_size]}))
+        return keys
+
+    def unique_rows(self, rows, key, existing):
+        unique = []
+        for row in rows:
+            row_key = key(row)
+            if row_key is not None and row_key in existing:
+                self.duplicates += 1
+                continue
+            if row_key is not None:
+                existing.add(row_key)
+            unique.append(row)
+        return unique
+
+    def scopes(self, chunk):
+        scopes = {caching.INDEX}
+        for post in chunk['post']:
+            scopes.update((caching.profile_scope(post.author_id), caching.stats_scope(post.author_id)))
+            if post.group_id is not None:
+                scopes.add(caching.group_scope(post.group_id))
+            if post.id is not None:
+                scopes.add(caching.post_scope(post.id))
+        scopes.update(caching.post_scope(comment.post_id) for comment in chunk['comment'])
+        for follow in chunk['follow']:
+            scopes.update((
+                caching.follow_scope(follow.user_id),
+                caching.stats_scope(follow.user_id),
+                caching.stats_scope(follow.author_id),
+            ))
+        return scopes
+
+    def reset_sequences(self):
+        # id постов и комментариев пришли из файла: на PostgreSQL
+        # последовательности надо догнать до max(id), как после loaddata
+        statements = connection.ops.sequence_reset_sql(no_style(), [Post, Comment])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
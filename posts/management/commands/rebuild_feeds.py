@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts import feed
+from posts.models import PullAuthor, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает pull-авторов и заново собирает входящие ленты подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Только ленты этих пользователей')
+
+    def handle(self, *args, **options):
+        if not options['usernames']:
+            self.refresh_pull_authors()
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        rebuilt = 0
+        for user in users.iterator():
+            feed.rebuild_inbox(user)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f'Пересобрано лент: {rebuilt}'))
+
+    def refresh_pull_authors(self):
+        pull_ids = list(
+            User.objects.annotate(followers=Count('following'))
+            .filter(followers__gt=feed.FANOUT_LIMIT).values_list('id', flat=True)
+        )
+        PullAuthor.objects.exclude(author_id__in=pull_ids).delete()
+        PullAuthor.objects.bulk_create(
+            [PullAuthor(author_id=author_id) for author_id in pull_ids], ignore_conflicts=True)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts import counters
+from posts.models import Post, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и пользователей пачками по id'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed_posts = self.reconcile(Post, counters.reconcile_posts, batch_size)
+        fixed_users = self.reconcile(User, counters.reconcile_users, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {fixed_posts}, пользователей: {fixed_users}'))
+
+    def reconcile(self, model, reconcile_range, batch_size):
+        # Каждая пачка - отдельная короткая транзакция, чтобы не держать
+        # блокировку на всю таблицу
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        fixed = 0
+        for start in range(1, last_id + 1, batch_size):
+            with transaction.atomic():
+                fixed += reconcile_range((start, start + batch_size - 1))
+        return fixed
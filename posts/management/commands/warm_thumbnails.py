@@ -0,0 +1,48 @@
+import os
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def warm_chunk(images):
+    """Нарезает миниатюры для пачки картинок [(имя, ширина, высота)]
+    в процессе пула. Возвращает (готово, ошибок)."""
+    done = failed = 0
+    for name, width, height in images:
+        try:
+            thumbnails.generate(name, (width, height) if width and height else None)
+            done += 1
+        except Exception:
+            thumbnails.logger.exception('Не удалось нарезать миниатюры для %s', name)
+            failed += 1
+    connections.close_all()
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = 'Заранее нарезает миниатюры всех размеров для картинок существующих постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        images = list(
+            Post.objects.exclude(image='').order_by()
+            .values_list('image', 'image_width', 'image_height').distinct())
+        chunk_size = options['chunk_size']
+        chunks = [images[start:start + chunk_size] for start in range(0, len(images), chunk_size)]
+        if options['processes'] > 1 and len(chunks) > 1:
+            # Дочерние процессы не должны унаследовать открытое соединение
+            connections.close_all()
+            with Pool(options['processes']) as pool:
+                results = list(pool.imap_unordered(warm_chunk, chunks))
+        else:
+            results = [warm_chunk(chunk) for chunk in chunks]
+        done = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        self.stdout.write(self.style.SUCCESS(f'Картинок обработано: {done}, с ошибками: {failed}'))
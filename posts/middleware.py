@@ -0,0 +1,84 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import caching
+
+PAGE_TTL = getattr(settings, 'ANONYMOUS_PAGE_CACHE_TTL', 10 * 60)
+CACHED_VIEWS = {
+    'index', 'group_posts', 'profile', 'post', 'post_comments',
+    'group_rss', 'group_atom', 'author_rss', 'author_atom',
+}
+# Параметры запроса, которые читают кэшируемые представления. Остальные
+# (utm-метки, мусор) в ключ не попадают: иначе каждый случайный query string
+# заводил бы свою запись и вытеснял из кэша настоящие страницы
+PAGE_PARAMS = ('cursor',)
+
+
+def page_cache_key(request):
+    params = urlencode([(name, request.GET[name]) for name in PAGE_PARAMS if request.GET.get(name)])
+    return 'page:%s' % hashlib.md5(('%s?%s' % (request.path, params)).encode()).hexdigest()
+
+
+class AnonymousPageCacheMiddleware:
+    """Кэширует целые ответы лент и страниц постов для гостей.
+
+    Представление отмечает через caching.add_surrogate_keys области, из
+    которых собрана страница (index, group:1, post:5, ...); они же уходят
+    в заголовок Surrogate-Key. Вместе с ответом хранятся поколения этих
+    областей; запись в любую из них (см. posts/signals.py) меняет поколение,
+    и при следующем чтении запись считается промахом. Так сбрасываются
+    ровно те страницы, которых коснулось изменение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        keys = getattr(request, 'surrogate_keys', None)
+        if keys:
+            response['Surrogate-Key'] = ' '.join(keys)
+        if (
+            keys
+            and getattr(request, '_page_cache_key', None)
+            and not getattr(request, 'served_stale', False)
+            and self._cacheable(response)
+        ):
+            cache.set(request._page_cache_key, {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': list(response.items()),
+                'scopes': list(keys),
+                'generations': list(keys.values()),
+            }, PAGE_TTL)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or request.user.is_authenticated
+            or request.resolver_match.url_name not in CACHED_VIEWS
+        ):
+            return None
+        key = page_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and caching.generations(*entry['scopes']) == entry['generations']:
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in entry['headers']:
+                response[header] = value
+            response['X-Page-Cache'] = 'HIT'
+            return response
+        request._page_cache_key = key
+        return None
+
+    @staticmethod
+    def _cacheable(response):
+        return (
+            response.status_code == 200
+            and not response.cookies
+            and not response.streaming
+        )
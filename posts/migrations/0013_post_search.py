@@ -0,0 +1,48 @@
+from django.db import migrations
+
+# Полнотекстовый индекс FTS5 по Post.text (только SQLite). Таблица хранит
+# лишь индекс (content='posts_post'), текст читается из самих постов;
+# триггеры держат индекс в согласии с таблицей при любой записи, в том
+# числе мимо ORM. Миграция, которая пересоздаёт posts_post (AlterField
+# на SQLite), удалит триггеры вместе со старой таблицей - их нужно
+# создать заново и выполнить 'rebuild'.
+CREATE = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5(text, content='posts_post', content_rowid='id', prefix='2 3')",
+    """CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+]
+DROP = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+
+def run(statements):
+    def execute(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth import get_user_model
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -15,6 +17,13 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        """Посты для ленты: автор и группа тем же запросом."""
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField("Текст", help_text="Напишите текст поста")
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
@@ -22,11 +31,36 @@ class Post(models.Model):
     group = models.ForeignKey(
         Group, on_delete=models.SET_NULL, blank=True, null=True,
         related_name="posts", verbose_name="Группа", help_text="Введите название группы")
-    image = models.ImageField(upload_to='posts/', blank=True, null=True, verbose_name="Изображение")
+    # Одинаковые картинки хранятся одним файлом, см. posts/storage.py
+    image = models.ImageField(
+        upload_to='posts/', storage=ContentAddressedStorage(), blank=True, null=True, verbose_name="Изображение")
+    # Размеры исходной картинки записываются при загрузке (posts/signals.py),
+    # для старых постов - командой backfill_image_sizes. width_field/height_field
+    # не используем: они открывают файл при каждой загрузке поста без размеров.
+    image_width = models.PositiveIntegerField("Ширина изображения", blank=True, null=True, editable=False)
+    image_height = models.PositiveIntegerField("Высота изображения", blank=True, null=True, editable=False)
+    # Счётчик хранится, а не считается на каждой отрисовке; см. posts/counters.py
+    comment_count = models.PositiveIntegerField("Комментариев", default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        # Под сортировку лент (pub_date, id): общая, в группе и у автора
+        indexes = [
+            models.Index(fields=["pub_date", "id"], name="posts_post_date_idx"),
+            models.Index(fields=["group", "pub_date", "id"], name="posts_post_group_date_idx"),
+            models.Index(fields=["author", "pub_date", "id"], name="posts_post_author_date_idx"),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_size(self):
+        if self.image and self.image_width and self.image_height:
+            return self.image_width, self.image_height
+        return None
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
@@ -34,10 +68,58 @@ class Comment(models.Model):
     text = models.TextField("Текст", help_text="Напишите комментарий")
     created = models.DateTimeField("Дата и время публикации", auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "created", "id"], name="posts_comment_post_created_idx"),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="follower")
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="following")
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "author"], name="posts_follow_unique"),
+        ]
+
     def __str__(self):
         return self.author.username
+
+
+class UserStats(models.Model):
+    # Денормализованные счётчики пользователя; см. posts/counters.py
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="stats")
+    posts_count = models.PositiveIntegerField("Записей", default=0)
+    followers_count = models.PositiveIntegerField("Подписчиков", default=0)
+    following_count = models.PositiveIntegerField("Подписан", default=0)
+
+
+class FeedEntryQuerySet(models.QuerySet):
+
+    def for_feed(self):
+        return self.select_related('post__author', 'post__group')
+
+
+class FeedEntry(models.Model):
+    # Запись во "входящих" ленты подписок: пост кладётся сюда при публикации,
+    # и лента читается одним проходом по индексу (user, pub_date, post)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feed_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="feed_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    pub_date = models.DateTimeField()
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"], name="posts_feed_user_date_idx"),
+            models.Index(fields=["user", "author"], name="posts_feed_user_author_idx"),
+        ]
+
+
+class PullAuthor(models.Model):
+    # Авторы с большим числом подписчиков: их посты не раскладываются по лентам,
+    # а подмешиваются при чтении
+    author = models.OneToOneField(User, on_delete=models.CASCADE, related_name="pull_mode")
@@ -0,0 +1,223 @@
+import base64
+import binascii
+import heapq
+import json
+import math
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# Лента по умолчанию: сначала новые записи, id разрешает совпадения pub_date
+FEED_ORDERING = ('-pub_date', '-id')
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def in_range(value):
+    """Целые из курсора должны помещаться в знаковые 64 бита (INTEGER
+    SQLite, bigint PostgreSQL), дробные - быть конечными: иначе драйвер
+    падает с OverflowError уже при выполнении запроса."""
+    if isinstance(value, int):
+        return -2 ** 63 <= value < 2 ** 63
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return True
+
+
+class RawSubquery(RawSQL):
+    """Сырой подзапрос для filter(id__in=...). Правую часть IN Django сам
+    берёт в скобки, а скобки RawSQL поверх них SQLite читает как скалярный
+    подзапрос: от всего списка осталась бы первая строка."""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class CursorPage(Sequence):
+    """Страница keyset-паджинатора: не знает своего номера и общего числа страниц,
+    вместо этого хранит курсоры на соседние страницы."""
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage %s>' % (self.cursor or 'first')
+
+    def __str__(self):
+        return self.cursor or ''
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Паджинация по ключу сортировки вместо OFFSET.
+
+    Каждая страница - это один запрос `WHERE (pub_date, id) < (...) LIMIT n + 1`
+    без COUNT(*), поэтому её стоимость не зависит от размера таблицы
+    и от того, насколько далеко пользователь ушёл по ленте.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING, transform=None, key_fields=None):
+        directions = {field.startswith('-') for field in ordering}
+        if len(directions) != 1:
+            raise ValueError('Все поля ordering должны сортироваться в одну сторону.')
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = tuple(field.lstrip('-') for field in ordering)
+        self.descending = directions.pop()
+        # transform превращает строку queryset в элемент страницы (например,
+        # запись ленты в пост), key_fields - поля ключа уже у элемента страницы
+        self.transform = transform
+        self.key_fields = tuple(key_fields or self.fields)
+
+    def key(self, item):
+        # Элементы - модели или словари из .values()
+        if isinstance(item, dict):
+            return tuple(item[name] for name in self.key_fields)
+        return tuple(getattr(item, name) for name in self.key_fields)
+
+    def encode_cursor(self, direction, item):
+        values = []
+        for value in self.key(item):
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in (NEXT, PREVIOUS) or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, binascii.Error, ValidationError) as error:
+            raise InvalidCursor(cursor) from error
+        if not all(in_range(value) for value in values):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _seek(self, values, forward):
+        # Раскрываем сравнение кортежей (a, b) > (x, y) в
+        # a > x OR (a = x AND b > y): так его понимают все бэкенды
+        # и используют составные индексы.
+        lookup = 'lt' if forward == self.descending else 'gt'
+        # Избыточное нестрогое условие на первое поле превращает проход
+        # индекса с начала в поиск диапазона (SEARCH ... USING INDEX)
+        condition = Q(**{'%s__%se' % (self.fields[0], lookup): values[0]})
+        alternatives = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{'%s__%s' % (name, lookup): values[position]})
+            for previous_name, previous_value in zip(self.fields[:position], values):
+                step &= Q(**{previous_name: previous_value})
+            alternatives |= step
+        return condition & alternatives
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else '-' + field
+            for field in self.ordering
+        )
+
+    def query(self, values, forward):
+        """Запрос за не более чем per_page + 1 строками после (forward) или до
+        ключа values в порядке обхода; лишняя строка говорит, что дальше ещё
+        есть записи."""
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        ordering = self.ordering if forward else self._reversed_ordering()
+        return queryset.order_by(*ordering)[:self.per_page + 1]
+
+    def fetch(self, values, forward):
+        rows = self.query(values, forward)
+        if self.transform is None:
+            return list(rows)
+        return [self.transform(row) for row in rows]
+
+    def page(self, cursor=None):
+        direction, values = NEXT, None
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+        forward = direction == NEXT
+        rows = self.fetch(values, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return self._build_page(rows, cursor, has_next=has_more, has_previous=values is not None)
+        rows.reverse()
+        return self._build_page(rows, cursor, has_next=True, has_previous=has_more)
+
+    def get_page(self, cursor=None):
+        """Как Paginator.get_page: битый курсор не ломает страницу,
+        а возвращает начало ленты."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def _build_page(self, rows, cursor, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(PREVIOUS, rows[0])
+        return CursorPage(rows, cursor, next_cursor, previous_cursor)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Сливает несколько отсортированных одинаково источников в одну ленту.
+
+    Каждый источник - CursorPaginator с тем же размером страницы и ключом
+    элементов; на страницу уходит по одному запросу на источник.
+    Элементы с одинаковым ключом выводятся один раз.
+    """
+
+    def __init__(self, paginators, per_page):
+        first = paginators[0]
+        super().__init__(
+            first.object_list, per_page, first.ordering,
+            transform=first.transform, key_fields=first.key_fields)
+        self.paginators = paginators
+
+    def fetch(self, values, forward):
+        streams = [paginator.fetch(values, forward) for paginator in self.paginators]
+        merged = heapq.merge(*streams, key=self.key, reverse=forward == self.descending)
+        rows = []
+        last_key = None
+        for item in merged:
+            item_key = self.key(item)
+            if item_key == last_key:
+                continue
+            rows.append(item)
+            last_key = item_key
+            if len(rows) > self.per_page:
+                break
+        return rows
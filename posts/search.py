@@ -0,0 +1,96 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+
+from .models import Post
+from .pagination import NEXT, PREVIOUS, CursorPaginator, InvalidCursor, RawSubquery, in_range
+
+# Индекс FTS5 по Post.text поддерживают триггеры из миграции 0013
+FTS_TABLE = 'posts_post_fts'
+WORD = re.compile(r'\w+')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """Строка поиска для MATCH: все слова обязательны, последнее - префиксом,
+    чтобы находилось и недописанное. Синтаксис FTS5 из ввода не попадает
+    в запрос: каждое слово берётся в кавычки."""
+    words = WORD.findall(text or '')
+    if not words:
+        return None
+    terms = ['"%s"' % word for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids(text):
+    """Подзапрос с id постов, подходящих под text, для filter(id__in=...)."""
+    query = fts_query(text)
+    if query is None:
+        return None
+    return RawSubquery('SELECT rowid FROM %s WHERE %s MATCH %%s' % (FTS_TABLE, FTS_TABLE), [query])
+
+
+class SearchPaginator(CursorPaginator):
+    """Выдача поиска по релевантности (bm25, меньше - лучше) с keyset-курсором
+    по паре (релевантность, id). Страница - один запрос к индексу FTS5
+    и один за самими постами."""
+
+    def __init__(self, text, per_page, group=None, author=None):
+        super().__init__(Post.objects.for_feed(), per_page, ordering=('search_rank', 'id'))
+        self.match = fts_query(text)
+        self.group = group
+        self.author = author
+
+    def decode_cursor(self, cursor):
+        # search_rank - не поле модели, поэтому значения курсора
+        # проверяем сами
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, (score, post_id) = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = [float(score), int(post_id)]
+            if direction not in (NEXT, PREVIOUS) or not all(in_range(value) for value in values):
+                raise InvalidCursor(cursor)
+            return direction, values
+        except (ValueError, TypeError, OverflowError, binascii.Error) as error:
+            raise InvalidCursor(cursor) from error
+
+    def fetch(self, values, forward):
+        if self.match is None:
+            return []
+        sql = (
+            'SELECT p.id, bm25({fts}) AS score FROM {fts} JOIN posts_post p ON p.id = {fts}.rowid'
+            ' WHERE {fts} MATCH %s'
+        ).format(fts=FTS_TABLE)
+        params = [self.match]
+        if self.group is not None:
+            sql += ' AND p.group_id = %s'
+            params.append(self.group.id)
+        if self.author is not None:
+            sql += ' AND p.author_id = %s'
+            params.append(self.author.id)
+        sql = 'SELECT id, score FROM (%s)' % sql
+        if values is not None:
+            # Тот же разбор сравнения кортежей, что и в CursorPaginator._seek
+            operator = '>' if forward else '<'
+            sql += ' WHERE score {op} %s OR (score = %s AND id {op} %s)'.format(op=operator)
+            params += [values[0], values[0], values[1]]
+        sql += ' ORDER BY score, id' if forward else ' ORDER BY score DESC, id DESC'
+        sql += ' LIMIT %s'
+        params.append(self.per_page + 1)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        posts = self.object_list.in_bulk([post_id for post_id, score in rows])
+        page = []
+        for post_id, score in rows:
+            post = posts[post_id]
+            post.search_rank = score
+            page.append(post)
+        return page
@@ -0,0 +1,89 @@
+from django.core.files.images import get_image_dimensions
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import caching, feed
+from .models import Comment, Follow, Group, Post
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feed.fan_out_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    # При смене группы пост должен пропасть и из кэша старой группы,
+    # при смене картинки - забыть её размеры
+    instance._previous_group_id = instance._previous_image = None
+    if instance.pk and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list('group_id', 'image').first() or (None, None))
+
+
+@receiver(pre_save, sender=Post)
+def store_image_size(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    image = instance.image
+    if not image:
+        instance.image_width = instance.image_height = None
+    elif not image._committed:
+        # Новая загрузка: размеры из заголовка файла, пока он ещё в памяти
+        instance.image_width, instance.image_height = get_image_dimensions(image)
+    elif image.name != instance._previous_image:
+        # Имя файла присвоено напрямую: размеры досчитает backfill_image_sizes
+        instance.image_width = instance.image_height = None
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_scopes(sender, instance, **kwargs):
+    scopes = caching.post_scopes(instance)
+    if kwargs.get('created', True):
+        # Создание и удаление (у post_delete нет created) меняют число записей автора
+        scopes.append(caching.stats_scope(instance.author_id))
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_scopes(sender, instance, **kwargs):
+    # Счётчик комментариев виден в карточке поста во всех лентах
+    post = Post.objects.filter(pk=instance.post_id).only('author_id', 'group_id').first()
+    if post is not None:
+        caching.bump(*caching.post_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_scope(sender, instance, **kwargs):
+    caching.bump(
+        caching.follow_scope(instance.user_id),
+        caching.stats_scope(instance.user_id),
+        caching.stats_scope(instance.author_id),
+    )
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_authors(sender, instance, **kwargs):
+    # После удаления у постов уже group = NULL: авторов запоминаем заранее
+    instance._author_ids = list(_group_author_ids(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_scope(sender, instance, **kwargs):
+    # Название и slug группы видны в карточках её постов на главной,
+    # в профилях авторов и, через их поколения, в лентах подписок
+    author_ids = getattr(instance, '_author_ids', None)
+    if author_ids is None:
+        author_ids = _group_author_ids(instance)
+    caching.bump(
+        caching.INDEX, caching.group_scope(instance.id),
+        *[caching.profile_scope(author_id) for author_id in author_ids])
+
+
+def _group_author_ids(group):
+    return Post.objects.filter(group_id=group.id).values_list('author_id', flat=True).distinct()
@@ -0,0 +1,11 @@
+from django import template
+
+from posts import caching
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    # Пары (пост, готовый HTML карточки) для цикла по странице ленты
+    return list(zip(posts, caching.post_cards(posts, context.get('request'))))
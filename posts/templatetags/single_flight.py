@@ -0,0 +1,54 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts import caching
+
+register = template.Library()
+
+
+class SingleFlightNode(template.Node):
+
+    def __init__(self, nodelist, timeout, fragment_name, generation, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.generation = generation
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        generation = self.generation.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        key = make_template_fragment_key(self.fragment_name, vary_on)
+        request = context.get('request')
+        content, content_generation = caching.single_flight(
+            key, lambda: self.nodelist.render(context), int(timeout), generation, request)
+        if content_generation != generation:
+            caching.mark_stale(request)
+        return content
+
+
+@register.tag
+def single_flight(parser, token):
+    """Как {% cache %}, но поколение передаётся отдельно от ключа:
+
+        {% single_flight cache_ttl index_page cache_generation user.id page.cursor %}
+        ...
+        {% endsingle_flight %}
+
+    После смены поколения фрагмент перерисовывает один запрос, остальные
+    до конца перерисовки получают прежний (см. caching.single_flight).
+    """
+    nodelist = parser.parse(('endsingle_flight',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4:
+        raise template.TemplateSyntaxError(
+            "'%s' tag requires at least 3 arguments." % bits[0])
+    return SingleFlightNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        parser.compile_filter(bits[3]),
+        [parser.compile_filter(bit) for bit in bits[4:]],
+    )
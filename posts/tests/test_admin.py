@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Group, Post
+
+
+User = get_user_model()
+
+
+class PostAdminTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.author = User.objects.create_user(username='username')
+        self.group = Group.objects.create(title='Группа', slug='group', description='Описание')
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username='author%s' % i)
+            Post.objects.create(text='Пост %s' % i, author=author, group=self.group)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_posts(2)
+        self.client.get(self.url)
+        # Сессия, пользователь, оценка и число строк, страница, две для дат
+        with self.assertNumQueries(7):
+            self.client.get(self.url)
+        self.create_posts(10)
+        with self.assertNumQueries(7):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['cl'].result_list), 12)
+
+    def test_filters_use_autocomplete(self):
+        own = Post.objects.create(text='Свой пост', author=self.author)
+        self.create_posts(3)
+        response = self.client.get(self.url, {'author__id__exact': self.author.id})
+        self.assertEqual(list(response.context['cl'].result_list), [own])
+        self.assertContains(response, 'data-ajax--url="%s"' % reverse('admin:auth_user_autocomplete'))
+        self.assertContains(response, 'data-ajax--url="%s"' % reverse('admin:posts_group_autocomplete'))
+        self.assertNotContains(response, '?group__id__exact=%s"' % self.group.id)
+        response = self.client.get(self.url, {'group__id__exact': 'x'})
+        self.assertRedirects(response, self.url + '?e=1', fetch_redirect_response=False)
+
+    @mock.patch('posts.admin.ESTIMATE_FROM', 3)
+    def test_unfiltered_count_is_estimated(self):
+        self.create_posts(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        Post.objects.create(text='После ANALYZE', author=self.author)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get(self.url, {'author__id__exact': self.author.id})
+        self.assertEqual(response.context['cl'].result_count, 1)
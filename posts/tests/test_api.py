@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Model
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import feed
+from posts.models import Comment, Follow, Group, Post, PullAuthor
+
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group', description='Описание')
+        self.posts = [
+            Post.objects.create(text='Пост %s' % i, author=self.author, group=self.group if i % 2 else None)
+            for i in range(5)
+        ]
+        self.client = Client()
+
+    def test_index_pages_through_cursor_without_model_instances(self):
+        url = reverse('api:index')
+        with mock.patch.object(Model, 'from_db', side_effect=AssertionError) as from_db:
+            first = self.client.get(url, {'limit': 3}).json()
+            second = self.client.get(url, {'limit': 3, 'cursor': first['next']}).json()
+        from_db.assert_not_called()
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+        self.assertIsNone(second['next'])
+        self.assertEqual(first['results'][0]['author'], 'author')
+        self.assertEqual([item['group'] for item in first['results']], [None, 'group', None])
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('api:group_posts', args=['group']), {'fields': 'text'})
+        self.assertEqual(response.json()['results'], [{'text': 'Пост 3'}, {'text': 'Пост 1'}])
+        response = self.client.get(reverse('api:index'), {'fields': 'text,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_errors_are_json(self):
+        self.assertEqual(self.client.get(reverse('api:profile', args=['nobody'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api:index'), {'cursor': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api:follow_index')).status_code, 401)
+        self.assertEqual(self.client.post(reverse('api:index')).status_code, 405)
+
+    def test_unchanged_feed_answers_304(self):
+        url = reverse('api:profile', args=['author'])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_follow_feed_merges_inbox_and_pull_authors(self):
+        puller = User.objects.create_user(username='puller')
+        pulled = Post.objects.create(text='От pull-автора', author=puller)
+        feed.follow(self.reader, self.author)
+        Follow.objects.create(user=self.reader, author=puller)
+        PullAuthor.objects.create(author=puller)
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('api:follow_index'), {'fields': 'id'})
+        expected = [pulled.id] + [post.id for post in reversed(self.posts)]
+        self.assertEqual([item['id'] for item in response.json()['results']], expected)
+
+    def test_post_detail_with_comment_pages(self):
+        post = self.posts[0]
+        comments = [Comment.objects.create(post=post, author=self.reader, text='Ответ %s' % i) for i in range(3)]
+        url = reverse('api:post', args=[post.id])
+        data = self.client.get(url, {'limit': 2, 'fields': 'id,text', 'comment_fields': 'text,author'}).json()
+        self.assertEqual(data['post'], {'id': post.id, 'text': 'Пост 0'})
+        self.assertEqual(data['comments']['results'], [
+            {'text': 'Ответ 0', 'author': 'reader'}, {'text': 'Ответ 1', 'author': 'reader'}])
+        data = self.client.get(url, {'limit': 2, 'cursor': data['comments']['next']}).json()
+        self.assertEqual([item['id'] for item in data['comments']['results']], [comments[2].id])
+        self.assertEqual(self.client.get(reverse('api:post', args=[999])).status_code, 404)
+
+    def test_group_rename_changes_post_detail_etag(self):
+        url = reverse('api:post', args=[self.posts[1].id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.group.slug = 'renamed'
+        self.group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['post']['group'], 'renamed')
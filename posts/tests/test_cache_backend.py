@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from yatube.cache import TieredCache
+
+
+class TieredCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        # Два экземпляра с общим LocMemCache (одно хранилище на LOCATION) -
+        # как два рабочих процесса с общим memcached
+        self.location = uuid.uuid4().hex
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+
+    def make_cache(self, **options):
+        options.setdefault('SHARED', {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': self.location,
+        })
+        options.setdefault('SHARED_ONLY_PREFIXES', ['generation:'])
+        options.setdefault('ALLOW_PROCESS_LOCAL', True)
+        return TieredCache('', {'OPTIONS': options})
+
+    def test_repeated_reads_hit_local_tier(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('missing'), None)
+        self.assertEqual(self.second.stats(), {
+            'local': {'hits': 1, 'misses': 2},
+            'shared': {'hits': 1, 'misses': 1},
+        })
+
+    def test_get_many_fills_local_tier(self):
+        self.first.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.second.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.assertEqual(self.second.get_many(['a', 'b']), {'a': 1, 'b': 2})
+        self.assertEqual(self.second.stats()['local'], {'hits': 2, 'misses': 3})
+
+    def test_generation_bump_is_seen_by_other_process_at_once(self):
+        self.first.set('generation:index', 1, None)
+        self.assertEqual(self.second.get('generation:index'), 1)
+        self.first.incr('generation:index')
+        self.assertEqual(self.second.get('generation:index'), 2)
+        self.assertEqual(self.second.stats()['local'], {'hits': 0, 'misses': 0})
+
+    def test_own_writes_replace_local_copy(self):
+        self.first.set('key', 'old')
+        self.first.get('key')
+        self.first.set('key', 'new')
+        self.assertEqual(self.first.get('key'), 'new')
+        self.first.set('counter', 1)
+        self.first.incr('counter')
+        self.assertEqual(self.first.get('counter'), 2)
+        self.first.incr_version('counter')
+        self.assertIsNone(self.first.get('counter'))
+        self.first.delete('key')
+        self.assertIsNone(self.first.get('key'))
+
+    def test_local_tier_is_bounded_by_size_and_time(self):
+        cache = self.make_cache(LOCAL_MAX_ENTRIES=2, LOCAL_TIMEOUT=5)
+        for key in 'abc':
+            cache.set(key, key)
+        self.assertEqual(len(cache._local), 2)
+        with mock.patch('yatube.cache.time.monotonic', return_value=10 ** 9):
+            self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(cache.stats()['local'], {'hits': 0, 'misses': 1})
+
+    def test_shared_tier_without_atomic_incr_is_rejected(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_cache(SHARED=shared)
+        self.make_cache(SHARED=shared, SHARED_ONLY_PREFIXES=[])
+
+    def test_process_local_shared_tier_needs_explicit_permission(self):
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            shared = {'BACKEND': 'django.core.cache.backends.' + backend, 'LOCATION': self.location}
+            with self.subTest(backend=backend), self.assertRaises(ImproperlyConfigured):
+                self.make_cache(SHARED=shared, ALLOW_PROCESS_LOCAL=False)
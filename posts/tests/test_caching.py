@@ -0,0 +1,169 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import caching
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class FragmentInvalidationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.reader = User.objects.create_user(username='reader')
+        self.group_1 = Group.objects.create(title='Группа-1', slug='test-slug-1', description='Group')
+        self.group_2 = Group.objects.create(title='Группа-2', slug='test-slug-2', description='Group')
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_new_post_is_shown_despite_cached_fragment(self):
+        Post.objects.create(text='Первый', author=self.author, group=self.group_1)
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Второй', author=self.author, group=self.group_1)
+        urls = (reverse('index'), reverse('group_posts', args=['test-slug-1']), reverse('profile', args=['username']))
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Второй')
+
+    def test_only_affected_scopes_are_bumped(self):
+        post = Post.objects.create(text='Текст', author=self.author, group=self.group_1)
+        before = caching.generations(
+            caching.INDEX, caching.group_scope(self.group_1.id), caching.group_scope(self.group_2.id))
+        Comment.objects.create(post=post, author=self.reader, text='Комментарий')
+        after = caching.generations(
+            caching.INDEX, caching.group_scope(self.group_1.id), caching.group_scope(self.group_2.id))
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertEqual(before[2], after[2])
+
+    def test_moving_post_bumps_previous_group(self):
+        post = Post.objects.create(text='Текст', author=self.author, group=self.group_1)
+        before = caching.generation(caching.group_scope(self.group_1.id))
+        post.group = self.group_2
+        post.save()
+        self.assertNotEqual(caching.generation(caching.group_scope(self.group_1.id)), before)
+
+    def test_group_change_bumps_pages_showing_its_cards(self):
+        Post.objects.create(text='Текст', author=self.author, group=self.group_1)
+        scopes = (caching.INDEX, caching.profile_scope(self.author.id), caching.profile_scope(self.reader.id))
+        before = caching.generations(*scopes)
+        self.group_1.title = 'Новое название'
+        self.group_1.save()
+        renamed = caching.generations(*scopes)
+        self.assertNotEqual(before[:2], renamed[:2])
+        self.assertEqual(before[2], renamed[2])
+        self.assertContains(self.guest_client.get(reverse('profile', args=['username'])), 'Новое название')
+        self.group_1.delete()
+        self.assertNotEqual(caching.generations(*scopes)[:2], renamed[:2])
+
+    def test_follow_generation_tracks_follows_and_followed_authors(self):
+        first = caching.follow_generation(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        second = caching.follow_generation(self.reader)
+        self.assertNotEqual(first, second)
+        Post.objects.create(text='Текст', author=self.author)
+        self.assertNotEqual(caching.follow_generation(self.reader), second)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertContains(response, 'Текст')
+
+
+class PostCardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cards_are_rendered_once_and_fetched_in_bulk(self):
+        posts = list(Post.objects.for_feed())
+        caching.post_cards(posts)
+        self.assertIsNotNone(cache.get(caching.post_card_key(posts[0])))
+        with mock.patch('posts.caching.render_to_string') as render:
+            caching.post_cards(posts)
+        render.assert_not_called()
+
+    def test_card_key_changes_with_visible_content(self):
+        post = Post.objects.for_feed().get()
+        key = caching.post_card_key(post)
+        post.comment_count += 1
+        self.assertNotEqual(caching.post_card_key(post), key)
+
+    def test_edit_link_is_not_shared_between_viewers(self):
+        response = self.author_client.get(reverse('profile', args=['username']))
+        self.assertContains(response, 'Редактировать')
+        response = self.reader_client.get(reverse('profile', args=['username']))
+        self.assertNotContains(response, 'Редактировать')
+        self.assertContains(response, 'Текст')
+
+
+class SingleFlightTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.guest_client = Client()
+
+    def test_fresh_value_is_not_recomputed(self):
+        compute = mock.Mock(return_value='value')
+        self.assertEqual(caching.single_flight('key', compute, 60, 1), ('value', 1))
+        self.assertEqual(caching.single_flight('key', compute, 60, 1), ('value', 1))
+        compute.assert_called_once()
+
+    def test_only_lock_holder_recomputes_others_get_stale_value(self):
+        caching.single_flight('key', lambda: 'old', 60, 1)
+        cache.add('lock:single_flight:key', 1)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(caching.single_flight('key', compute, 60, 2), ('old', 1))
+        compute.assert_not_called()
+        cache.delete('lock:single_flight:key')
+        self.assertEqual(caching.single_flight('key', compute, 60, 2), ('new', 2))
+
+    def test_expired_soft_ttl_is_recomputed(self):
+        caching.single_flight('key', lambda: 'old', 0, 1)
+        self.assertEqual(caching.single_flight('key', lambda: 'new', 60, 1), ('new', 1))
+
+    @mock.patch('posts.caching.LOCK_WAIT', 0)
+    def test_without_stale_value_waiter_computes_itself(self):
+        cache.add('lock:single_flight:key', 1)
+        self.assertEqual(caching.single_flight('key', lambda: 'value', 60, 1), ('value', 1))
+
+    def test_stale_feed_is_served_without_validators_and_not_page_cached(self):
+        Post.objects.create(text='Первый', author=self.author)
+        self.guest_client.get(reverse('index'))
+        Post.objects.create(text='Второй', author=self.author)
+        with mock.patch('posts.caching.cache.add', return_value=False):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Первый')
+        self.assertNotContains(response, 'Второй')
+        stale_etag = response.get('ETag')
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotEqual(response.get('X-Page-Cache'), 'HIT')
+        self.assertContains(response, 'Второй')
+        self.assertNotEqual(response['ETag'], stale_etag)
+
+    def test_follow_feed_is_recomputed_in_single_flight(self):
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        Post.objects.create(text='Первый', author=self.author)
+        client.get(reverse('follow_index'))
+        Post.objects.create(text='Второй', author=self.author)
+        # Пока ленту перерисовывает другой запрос, отдаём прежнюю
+        with mock.patch('posts.caching.cache.add', return_value=False):
+            response = client.get(reverse('follow_index'))
+        self.assertContains(response, 'Первый')
+        self.assertNotContains(response, 'Второй')
+        self.assertContains(client.get(reverse('follow_index')), 'Второй')
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Group, Post
+
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.group = Group.objects.create(title='Группа-1', slug='test-slug-1', description='Group')
+        self.post = Post.objects.create(text='Текст', author=self.author, group=self.group)
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', args=['test-slug-1']),
+            reverse('profile', args=['username']),
+            reverse('post', args=['username', self.post.id]),
+        ]
+        # CSRF-cookie браузер получает с первой же формой; ETag от него зависит
+        self.authorized_client.get(reverse('post', args=['username', self.post.id]))
+
+    def test_unchanged_pages_answer_304(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+                response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_alone_does_not_answer_304(self):
+        # Точности в секунду не хватает: правка в ту же секунду дала бы 304
+        url = reverse('index')
+        response = self.authorized_client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_validator(self):
+        url = reverse('post', args=['username', self.post.id])
+        etag = self.authorized_client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.author, text='Комментарий')
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_validator_depends_on_viewer(self):
+        url = reverse('index')
+        etag = self.authorized_client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_csrf_secret_changes_validator(self):
+        # Вход заново меняет CSRF-секрет: форма комментария со старым
+        # токеном получила бы 403, поэтому 304 отдавать нельзя
+        url = reverse('post', args=['username', self.post.id])
+        etag = self.authorized_client.get(url)['ETag']
+        self.assertEqual(self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.authorized_client.logout()
+        self.authorized_client.force_login(self.author)
+        self.authorized_client.cookies['csrftoken'] = 'a' * 64
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_cached_anonymous_page_answers_304(self):
+        url = reverse('index')
+        guest_client = Client()
+        etag = guest_client.get(url)['ETag']
+        response = guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
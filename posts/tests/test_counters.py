@@ -0,0 +1,58 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Post, UserStats
+
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Sonya')
+        self.author = User.objects.create_user(username='username')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_keep_counters_in_sync(self):
+        self.authorized_client.post(reverse('new_post'), data={'text': 'Текст'})
+        post = Post.objects.get(author=self.user)
+        self.authorized_client.post(reverse('add_comment', args=['Sonya', post.id]), data={'text': 'Комментарий'})
+        self.authorized_client.get(reverse('profile_follow', args=['username']))
+        # Повторная подписка не увеличивает счётчики
+        self.authorized_client.get(reverse('profile_follow', args=['username']))
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(self.user.stats.following_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.author).followers_count, 1)
+
+        self.authorized_client.get(reverse('profile_unfollow', args=['username']))
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.following_count, 0)
+        self.assertEqual(UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_profile_shows_stored_counters(self):
+        UserStats.objects.create(user=self.author, posts_count=5, followers_count=3, following_count=2)
+        response = self.authorized_client.get(reverse('profile', args=['username']))
+        self.assertContains(response, 'Подписчиков: 3')
+        self.assertContains(response, 'Подписан: 2')
+        self.assertContains(response, 'Записей: 5')
+
+    def test_reconcile_counters_repairs_drift(self):
+        post = Post.objects.create(text='Текст', author=self.author)
+        post.comments.create(author=self.user, text='Комментарий')
+        UserStats.objects.create(user=self.author, posts_count=10, followers_count=4)
+        call_command('reconcile_counters', batch_size=1, stdout=StringIO())
+        post.refresh_from_db()
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual((stats.posts_count, stats.followers_count, stats.following_count), (1, 0, 0))
+        self.assertTrue(UserStats.objects.filter(user=self.user).exists())
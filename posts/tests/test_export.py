@@ -0,0 +1,63 @@
+import json
+import zipfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.utils import TempMediaMixin, small_gif
+
+
+User = get_user_model()
+
+
+class ExportTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='username')
+        self.other = User.objects.create_user(username='other')
+        group = Group.objects.create(title='Группа', slug='group', description='Описание')
+        self.first = Post.objects.create(text='Первый', author=self.user, group=group)
+        self.second = Post.objects.create(text='Второй', author=self.user)
+        Post.objects.create(text='Чужой', author=self.other)
+        Comment.objects.create(post=self.first, author=self.user, text='Ответ себе')
+        Comment.objects.create(post=self.first, author=self.other, text='Чужой ответ')
+        Follow.objects.create(user=self.user, author=self.other)
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('profile_export', args=['username'])
+
+    def test_ndjson_streams_only_own_data(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="username.ndjson"')
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([record['type'] for record in records], ['post', 'post', 'comment', 'follow'])
+        self.assertEqual(records[0]['group'], 'group')
+        self.assertEqual(records[2]['text'], 'Ответ себе')
+        self.assertEqual(records[3], {'type': 'follow', 'user': 'username', 'author': 'other'})
+
+    def test_export_of_another_user_is_refused(self):
+        response = self.client.get(reverse('profile_export', args=['other']))
+        self.assertRedirects(response, reverse('profile', args=['other']))
+        response = Client().get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response.url)
+
+    def test_zip_contains_data_and_each_image_once(self):
+        image = SimpleUploadedFile('small.gif', small_gif(), content_type='image/gif')
+        for post in (self.first, self.second):
+            post.image = SimpleUploadedFile('small.gif', small_gif(), content_type='image/gif')
+            post.save()
+        response = self.client.get(self.url, {'format': 'zip'})
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        name = Post.objects.get(pk=self.first.pk).image.name
+        self.assertEqual(archive.namelist(), ['data.ndjson', 'images/' + name])
+        self.assertEqual(archive.read('images/' + name), image.read())
+        self.assertEqual(len(archive.read('data.ndjson').splitlines()), 4)
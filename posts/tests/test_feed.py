@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import feed
+from posts.models import FeedEntry, Follow, Post, PullAuthor
+
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.star = User.objects.create_user(username='star')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, post=post).exists())
+
+    def test_follow_backfills_and_unfollow_cleans_inbox(self):
+        post = Post.objects.create(text='Текст', author=self.author)
+        self.client.get(reverse('profile_follow', args=[self.author.username]))
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.client.get(reverse('profile_unfollow', args=[self.author.username]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_pull_author_posts_are_merged_on_read(self):
+        PullAuthor.objects.create(author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        star_post = Post.objects.create(text='Звезда', author=self.star)
+        author_post = Post.objects.create(text='Текст', author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(post=star_post).exists())
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']), [author_post, star_post])
+
+    def test_merged_feed_pages_in_order(self):
+        PullAuthor.objects.create(author=self.star)
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        for i in range(7):
+            Post.objects.create(text='Звезда' + str(i), author=self.star)
+            Post.objects.create(text='Текст' + str(i), author=self.author)
+        paginator = feed.follow_paginator(self.reader, 5)
+        seen = []
+        page = paginator.get_page()
+        seen.extend(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, list(Post.objects.order_by('-pub_date', '-id')))
+        back = paginator.get_page(page.previous_cursor)
+        self.assertEqual(list(back), seen[-9:-4])
+
+    def test_pull_authors_are_read_in_one_query(self):
+        # Входящие, список pull-авторов и их посты - при любом числе авторов
+        for number in range(4):
+            star = User.objects.create_user(username='star%s' % number)
+            PullAuthor.objects.create(author=star)
+            Follow.objects.create(user=self.reader, author=star)
+            for i in range(3):
+                Post.objects.create(text='Звезда %s-%s' % (number, i), author=star)
+            with self.assertNumQueries(3):
+                page = list(feed.follow_paginator(self.reader, 5).get_page())
+        self.assertEqual(page, list(Post.objects.order_by('-pub_date', '-id')[:5]))
+
+    def test_rebuild_feeds_command(self):
+        Post.objects.create(text='Текст', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        call_command('rebuild_feeds', self.reader.username, stdout=StringIO())
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 1)
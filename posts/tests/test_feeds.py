@@ -0,0 +1,65 @@
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Group, Post
+
+
+User = get_user_model()
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class SyndicationFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.group = Group.objects.create(title='Группа', slug='group', description='Описание группы')
+        self.posts = [
+            Post.objects.create(text='Пост %s' % i, author=self.author, group=self.group) for i in range(3)
+        ]
+        Post.objects.create(text='Вне группы', author=User.objects.create_user(username='other'))
+        self.client = Client()
+
+    def test_group_rss_lists_latest_posts_first(self):
+        response = self.client.get(reverse('group_rss', args=['group']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('application/rss+xml'))
+        channel = ElementTree.fromstring(response.content).find('channel')
+        self.assertEqual(channel.findtext('title'), 'Yatube: Группа')
+        self.assertEqual(
+            [item.findtext('link') for item in channel.findall('item')],
+            ['http://testserver' + reverse('post', args=['username', post.id]) for post in reversed(self.posts)])
+
+    def test_author_atom(self):
+        response = self.client.get(reverse('author_atom', args=['username']))
+        feed = ElementTree.fromstring(response.content)
+        self.assertEqual(feed.tag, ATOM + 'feed')
+        self.assertEqual(len(feed.findall(ATOM + 'entry')), 3)
+        self.assertEqual(self.client.get(reverse('author_atom', args=['nobody'])).status_code, 404)
+
+    def test_unchanged_feed_answers_304_until_post_is_edited(self):
+        url = reverse('author_rss', args=['username'])
+        response = self.client.get(url)
+        # Last-Modified по дате последнего поста не заметил бы правку
+        self.assertFalse(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        post = self.posts[0]
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_feed_document_is_cached_for_guests(self):
+        url = reverse('group_atom', args=['group'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        Post.objects.create(text='Новый пост', author=self.author, group=self.group)
+        self.assertContains(self.client.get(url), 'Новый пост')
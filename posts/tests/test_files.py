@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import resolve
+from django.utils.http import http_date
+from yatube import files
+
+
+class ServeFilesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.content = bytes(range(256)) * 4
+        self.write('posts/photo.jpg', self.content)
+        self.write('cache/ab/cd/0123456789abcdef0123456789abcdef.webp', b'webp')
+        self.factory = RequestFactory()
+
+    def write(self, path, content):
+        fullpath = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(fullpath), exist_ok=True)
+        with open(fullpath, 'wb') as file:
+            file.write(content)
+
+    def get(self, path, **headers):
+        return files.serve(self.factory.get('/media/' + path, **headers), path, self.root)
+
+    def test_full_file_with_validators(self):
+        response = self.get('posts/photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], files.REVALIDATE)
+        self.assertEqual(self.get('posts/photo.jpg', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        later = http_date(os.stat(os.path.join(self.root, 'posts/photo.jpg')).st_mtime + 60)
+        self.assertEqual(self.get('posts/photo.jpg', HTTP_IF_MODIFIED_SINCE=later).status_code, 304)
+
+    def test_hashed_names_are_cached_forever(self):
+        response = self.get('cache/ab/cd/0123456789abcdef0123456789abcdef.webp')
+        self.assertEqual(response['Cache-Control'], files.IMMUTABLE)
+
+    def test_byte_ranges(self):
+        cases = {
+            'bytes=0-9': (0, 9),
+            'bytes=1000-': (1000, 1023),
+            'bytes=-24': (1000, 1023),
+            'bytes=1000-5000': (1000, 1023),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response = self.get('posts/photo.jpg', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], 'bytes %s-%s/1024' % (start, end))
+                self.assertEqual(b''.join(response.streaming_content), self.content[start:end + 1])
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        response = self.get('posts/photo.jpg', HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+        self.assertEqual(self.get('posts/photo.jpg', HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+        backwards = self.get('posts/photo.jpg', HTTP_RANGE='bytes=500-3')
+        self.assertEqual(backwards.status_code, 200)
+        self.assertNotIn('Content-Range', backwards)
+        stale = self.get('posts/photo.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+        etag = self.get('posts/photo.jpg')['ETag']
+        fresh = self.get('posts/photo.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(fresh.status_code, 206)
+
+    def test_missing_and_outside_files_are_404(self):
+        for path in ('posts/missing.jpg', 'posts', '../etc/passwd', '/etc/passwd'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                self.get(path)
+
+    def test_sendfile_handoff(self):
+        self.write('posts/фото 1.jpg', b'jpeg')
+        prefixes = {os.path.realpath(self.root): '/internal/media/'}
+        with mock.patch('yatube.files.SENDFILE_BACKEND', 'x-accel-redirect'), \
+                mock.patch('yatube.files.SENDFILE_ACCEL_PREFIXES', prefixes):
+            response = self.get('posts/photo.jpg')
+            self.assertEqual(response['X-Accel-Redirect'], '/internal/media/posts/photo.jpg')
+            self.assertEqual(response.content, b'')
+            response = files.serve(self.factory.get('/media/'), 'posts/фото 1.jpg', self.root + '/')
+            self.assertEqual(response['X-Accel-Redirect'], '/internal/media/posts/%D1%84%D0%BE%D1%82%D0%BE%201.jpg')
+        with mock.patch('yatube.files.SENDFILE_BACKEND', 'x-sendfile'):
+            response = self.get('posts/photo.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'posts/photo.jpg'))
+
+    def test_root_without_accel_prefix(self):
+        # Сами отдают файл, а urls.py с таким корнем не загрузится
+        with mock.patch('yatube.files.SENDFILE_BACKEND', 'x-accel-redirect'):
+            response = self.get('posts/photo.jpg')
+            self.assertEqual(b''.join(response.streaming_content), self.content)
+            self.assertFalse(response.has_header('X-Accel-Redirect'))
+            with self.assertRaises(ImproperlyConfigured):
+                files.serve_urls('/media/', self.root)
+
+    def test_media_and_static_are_routed(self):
+        self.assertEqual(resolve('/media/posts/photo.jpg').func, files.serve)
+        self.assertEqual(resolve('/static/css/site.css').func, files.serve)
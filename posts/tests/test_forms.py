@@ -5,6 +5,11 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from io import BytesIO
+from unittest import mock
+from PIL import Image
+from posts import images
+from posts.forms import PostForm
 
 
 User = get_user_model()
@@ -84,3 +89,58 @@ class PostCreateFormTests(TestCase):
         self.authorized_client.post(
             reverse('post_edit', args=[self.user.username, self.post.id]), data=form_data, follow=True)
         self.assertEqual(Post.objects.filter(id=self.post.id).last().text, 'Текст')
+
+
+class ImageNormalizationTests(TestCase):
+
+    @staticmethod
+    def upload(size, mode='RGB', fmt='JPEG', name='photo.jpg', **save_options):
+        buffer = BytesIO()
+        Image.new(mode, size).save(buffer, fmt, **save_options)
+        return SimpleUploadedFile(name=name, content=buffer.getvalue(), content_type='image/jpeg')
+
+    def clean(self, upload):
+        form = PostForm({'text': 'Текст'}, {'image': upload})
+        return form, form.is_valid()
+
+    def open_cleaned(self, form):
+        image = form.cleaned_data['image']
+        image.seek(0)
+        return Image.open(image)
+
+    def test_exif_is_applied_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90° по часовой
+        exif[0x010F] = 'Camera'
+        form, valid = self.clean(self.upload((40, 20), exif=exif.tobytes()))
+        self.assertTrue(valid)
+        image = self.open_cleaned(form)
+        self.assertEqual(image.size, (20, 40))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertNotIn('exif', image.info)
+        self.assertTrue(image.info.get('progressive') or image.info.get('progression'))
+
+    def test_resolution_is_capped(self):
+        form, valid = self.clean(self.upload((images.MAX_SIDE * 2, images.MAX_SIDE)))
+        self.assertTrue(valid)
+        self.assertEqual(self.open_cleaned(form).size, (images.MAX_SIDE, images.MAX_SIDE // 2))
+
+    def test_transparent_png_becomes_jpeg(self):
+        form, valid = self.clean(self.upload((10, 10), mode='RGBA', fmt='PNG', name='logo.png'))
+        self.assertTrue(valid)
+        self.assertEqual(form.cleaned_data['image'].name, 'logo.jpg')
+        self.assertEqual(self.open_cleaned(form).mode, 'RGB')
+
+    def test_truncated_image_is_a_form_error(self):
+        upload = self.upload((400, 400))
+        upload = SimpleUploadedFile(name='photo.jpg', content=upload.read()[:800], content_type='image/jpeg')
+        form, valid = self.clean(upload)
+        self.assertFalse(valid)
+        self.assertEqual(form.errors.as_data()['image'][0].code, 'invalid_image')
+
+    def test_too_many_pixels_are_rejected_by_header(self):
+        with mock.patch('posts.images.MAX_PIXELS', 100), mock.patch('posts.images.ImageOps') as ops:
+            form, valid = self.clean(self.upload((20, 20)))
+        self.assertFalse(valid)
+        self.assertEqual(form.errors.as_data()['image'][0].code, 'too_many_pixels')
+        ops.exif_transpose.assert_not_called()
@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class ImportJsonlTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'data.jsonl')
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа', slug='group', description='Описание')
+
+    def write(self, records):
+        with open(self.path, 'w') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def run_import(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_jsonl', self.path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def posts(self, count, start=1):
+        return [
+            {'type': 'post', 'id': i, 'text': 'Пост %s' % i, 'author': 'author', 'group': 'group',
+             'pub_date': '2019-01-%02dT10:00:00+00:00' % i}
+            for i in range(start, start + count)
+        ]
+
+    def test_rows_are_imported_with_original_dates(self):
+        self.write(self.posts(2) + [
+            {'type': 'comment', 'id': 7, 'post': 1, 'author': 'reader', 'text': 'Ответ',
+             'created': '2019-02-01T12:00:00+00:00'},
+            {'type': 'comment', 'post': 100, 'author': 'reader', 'text': 'Нет поста',
+             'created': '2019-02-01T12:00:00+00:00'},
+            {'type': 'post', 'id': 3, 'text': 'Чужой', 'author': 'nobody', 'pub_date': '2019-01-03T10:00:00+00:00'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+        ])
+        out, err = self.run_import(chunk_size=3, batch_size=1)
+        self.assertEqual(list(Post.objects.order_by('id').values_list('id', 'group_id')), [(1, 1), (2, 1)])
+        self.assertEqual(Post.objects.get(id=1).pub_date, datetime(2019, 1, 1, 10, tzinfo=timezone.utc))
+        comment = Comment.objects.get()
+        self.assertEqual((comment.id, comment.post_id), (7, 1))
+        self.assertEqual(comment.created, datetime(2019, 2, 1, 12, tzinfo=timezone.utc))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertIn('follow: 1; пропущено: 2; повторов: 1', out)
+        self.assertIn("KeyError('nobody')", err)
+        with open(self.path + '.checkpoint') as file:
+            self.assertEqual(int(file.read()), os.path.getsize(self.path))
+
+    def test_import_resumes_from_checkpoint(self):
+        self.write(self.posts(4))
+        with open(self.path, 'rb') as file:
+            two_lines = len(file.readline()) + len(file.readline())
+        with open(self.path + '.checkpoint', 'w') as file:
+            file.write(str(two_lines))
+        out, err = self.run_import()
+        self.assertIn('Продолжаем с байта %s' % two_lines, out)
+        self.assertEqual(list(Post.objects.values_list('id', flat=True).order_by('id')), [3, 4])
+        self.assertIn('Загружено post: 2,', out)
+        # Повтор уже загруженного файла ничего не дублирует и не считает
+        # пропущенные строки загруженными
+        out, err = self.run_import(restart=True)
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertIn('Загружено post: 2, comment: 0, follow: 0; пропущено: 0; повторов: 2', out)
+
+    def test_broken_line_stops_after_committed_chunks(self):
+        self.write(self.posts(2))
+        with open(self.path, 'a') as file:
+            file.write('{не json\n')
+        with self.assertRaises(CommandError):
+            self.run_import(chunk_size=1)
+        self.assertEqual(Post.objects.count(), 2)
+        with open(self.path + '.checkpoint') as file:
+            self.assertEqual(int(file.read()), os.path.getsize(self.path) - len('{не json\n'.encode()))
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Group, Post
+
+
+User = get_user_model()
+
+
+class AnonymousPageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.group_1 = Group.objects.create(title='Группа-1', slug='test-slug-1', description='Group')
+        self.group_2 = Group.objects.create(title='Группа-2', slug='test-slug-2', description='Group')
+        self.post_1 = Post.objects.create(text='Пост 1', author=self.author, group=self.group_1)
+        self.post_2 = Post.objects.create(text='Пост 2', author=self.author, group=self.group_2)
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def is_hit(self, client, url):
+        return client.get(url).get('X-Page-Cache') == 'HIT'
+
+    def test_repeated_anonymous_request_is_served_from_cache(self):
+        url = reverse('index')
+        response = self.guest_client.get(url)
+        self.assertIn('index', response['Surrogate-Key'].split())
+        self.assertIn('post:%s' % self.post_1.id, response['Surrogate-Key'].split())
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.get('X-Page-Cache'), 'HIT')
+        self.assertContains(response, 'Пост 1')
+
+    def test_unused_query_params_share_the_cached_page(self):
+        url = reverse('index')
+        self.guest_client.get(url, {'utm_source': 'mail'})
+        self.assertTrue(self.is_hit(self.guest_client, url + '?junk=1'))
+        self.assertFalse(self.is_hit(self.guest_client, url + '?cursor=abc'))
+
+    def test_authenticated_requests_are_not_cached(self):
+        url = reverse('index')
+        self.authorized_client.get(url)
+        self.assertFalse(self.is_hit(self.authorized_client, url))
+
+    def test_comment_purges_only_its_post_page(self):
+        url_1 = reverse('post', args=['username', self.post_1.id])
+        url_2 = reverse('post', args=['username', self.post_2.id])
+        self.guest_client.get(url_1)
+        self.guest_client.get(url_2)
+        Comment.objects.create(post=self.post_1, author=self.author, text='Комментарий')
+        self.assertFalse(self.is_hit(self.guest_client, url_1))
+        self.assertTrue(self.is_hit(self.guest_client, url_2))
+
+    def test_new_post_purges_its_feeds_only(self):
+        urls = {
+            'index': reverse('index'),
+            'group_1': reverse('group_posts', args=['test-slug-1']),
+            'group_2': reverse('group_posts', args=['test-slug-2']),
+        }
+        for url in urls.values():
+            self.guest_client.get(url)
+        Post.objects.create(text='Пост 3', author=self.author, group=self.group_1)
+        self.assertFalse(self.is_hit(self.guest_client, urls['index']))
+        self.assertFalse(self.is_hit(self.guest_client, urls['group_1']))
+        self.assertTrue(self.is_hit(self.guest_client, urls['group_2']))
@@ -0,0 +1,81 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Post
+from posts.pagination import CursorPaginator
+
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='username')
+        # bulk_create даёт одинаковый pub_date, порядок решает id
+        Post.objects.bulk_create(
+            Post(text='Тестовый пост' + str(i), author=cls.author) for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_pages_cover_feed_without_gaps(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        seen = []
+        page = paginator.get_page()
+        seen.extend(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_same_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        self.assertTrue(second.has_previous())
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_last_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page()
+        page = paginator.get_page(page.next_cursor)
+        page = paginator.get_page(page.next_cursor)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        self.assertEqual(list(paginator.get_page('мусор')), list(paginator.get_page()))
+
+    def test_out_of_range_cursor_returns_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        raw = json.dumps(['n', ['2019-01-01T00:00:00+00:00', 10 ** 30]]).encode()
+        cursor = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+        self.assertEqual(list(paginator.get_page(cursor)), list(paginator.get_page()))
+        self.assertEqual(self.guest_client.get(reverse('index'), {'cursor': cursor}).status_code, 200)
+
+    def test_view_uses_cursor_parameter(self):
+        response = self.guest_client.get(reverse('index'))
+        next_cursor = response.context.get('page').next_cursor
+        response = self.guest_client.get(reverse('index'), {'cursor': next_cursor})
+        self.assertEqual(len(response.context.get('page')), 10)
+        self.assertContains(response, '?cursor=')
+
+    def test_page_cost_does_not_depend_on_position(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+        # Один запрос на страницу и никакого COUNT(*)
+        with self.assertNumQueries(1):
+            list(paginator.get_page(cursor))
@@ -0,0 +1,132 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import counters
+from posts.models import Comment, Follow, Group, Post
+from posts.views import comment_page
+
+
+User = get_user_model()
+
+
+class FeedQueryCountTests(TestCase):
+    """Число запросов страницы ленты не зависит от числа постов на ней."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Группа-1', slug='test-slug-1', description='Group')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(text='Текст' + str(i), author=self.author, group=self.group)
+            comment = Comment.objects.create(post=post, author=self.reader, text='Комментарий')
+            counters.comment_created(comment)
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_feed_pages_do_not_query_per_post(self):
+        pages = {
+            'index': (self.guest_client, reverse('index')),
+            'group_posts': (self.guest_client, reverse('group_posts', args=['test-slug-1'])),
+            'profile': (self.guest_client, reverse('profile', args=['username'])),
+            'follow_index': (self.authorized_client, reverse('follow_index')),
+        }
+        self.create_posts(1)
+        single = {name: self.count_queries(*page) for name, page in pages.items()}
+        self.create_posts(9)
+        for name, page in pages.items():
+            with self.subTest(page=name):
+                self.assertEqual(self.count_queries(*page), single[name])
+
+    def test_index_page_query_count(self):
+        self.create_posts(10)
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1', count=10)
+
+
+class QueryPlanTests(TestCase):
+
+    def test_view_queries_use_indexes(self):
+        # Команда падает, если в плане есть полный проход таблицы или сортировка
+        call_command('explain_queries', check=True, stdout=StringIO())
+
+
+class CommentPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+        self.post = Post.objects.create(text='Текст', author=self.author)
+        self.url = reverse('post', args=['username', self.post.id])
+        self.guest_client = Client()
+
+    def create_comments(self, count):
+        for i in range(count):
+            commenter = User.objects.create_user(username='commenter%s' % Comment.objects.count())
+            Comment.objects.create(post=self.post, author=commenter, text='Комментарий %s' % i)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.guest_client.get(url)
+        return len(context)
+
+    def test_comment_authors_are_not_queried_per_comment(self):
+        self.create_comments(1)
+        single = self.count_queries(self.url)
+        self.create_comments(9)
+        self.assertEqual(self.count_queries(self.url), single)
+
+    @mock.patch('posts.views.COMMENTS_PER_PAGE', 3)
+    def test_load_more_returns_next_fragment(self):
+        self.create_comments(7)
+        response = self.guest_client.get(self.url)
+        page = response.context['comments_page']
+        self.assertEqual(
+            [comment.text for comment in response.context['comments_page']], ['Комментарий %s' % i for i in range(3)])
+        self.assertContains(response, 'Показать ещё')
+        fragment = self.guest_client.get(
+            reverse('post_comments', args=['username', self.post.id]), {'cursor': page.next_cursor})
+        self.assertNotContains(fragment, '<html')
+        self.assertEqual(
+            [comment.text for comment in fragment.context['comments_page']],
+            ['Комментарий %s' % i for i in range(3, 6)])
+        last = self.guest_client.get(
+            reverse('post_comments', args=['username', self.post.id]),
+            {'cursor': fragment.context['comments_page'].next_cursor})
+        self.assertContains(last, 'Комментарий 6')
+        self.assertNotContains(last, 'Показать ещё')
+
+    def test_comment_page_is_one_query(self):
+        self.create_comments(3)
+        with self.assertNumQueries(1):
+            page, comments = comment_page(self.post)
+            self.assertEqual([comment.author.username for comment in page], ['commenter0', 'commenter1', 'commenter2'])
+            self.assertEqual(len(comments), 3)
+
+    def test_bad_fragment_cursor_is_404(self):
+        # Начало обсуждения вместо следующей страницы задвоило бы комментарии
+        self.create_comments(1)
+        response = self.guest_client.get(reverse('post_comments', args=['username', self.post.id]), {'cursor': 'x'})
+        self.assertEqual(response.status_code, 404)
+        self.assertContains(self.guest_client.get(self.url, {'cursor': 'x'}), 'Комментарий 0')
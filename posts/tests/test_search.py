@@ -0,0 +1,105 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Group, Post
+from posts.search import SearchPaginator, fts_query
+
+
+User = get_user_model()
+
+
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username')
+
+    def found(self, text, **filters):
+        return list(SearchPaginator(text, 10, **filters).get_page())
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        post = Post.objects.create(text='Кошки гуляют сами по себе', author=self.author)
+        self.assertEqual(self.found('кошки'), [post])
+        Post.objects.filter(pk=post.pk).update(text='Собаки гуляют с хозяином')
+        self.assertEqual(self.found('кошки'), [])
+        self.assertEqual(self.found('собаки'), [post])
+        post.delete()
+        self.assertEqual(self.found('собаки'), [])
+
+    def test_last_word_matches_prefix_and_syntax_is_ignored(self):
+        post = Post.objects.create(text='Прогулка по набережной', author=self.author)
+        self.assertEqual(self.found('прогулка набер'), [post])
+        self.assertEqual(fts_query('a" OR NEAR(b'), '"a" "OR" "NEAR" "b"*')
+        self.assertIsNone(fts_query(' "*" '))
+
+    def test_results_are_ranked_and_filtered(self):
+        group = Group.objects.create(title='Группа', slug='group', description='Описание')
+        other = User.objects.create_user(username='other')
+        rare = Post.objects.create(text='Лес, поле и река за домом', author=self.author)
+        frequent = Post.objects.create(text='Лес, лес и снова лес', author=other, group=group)
+        self.assertEqual(self.found('лес'), [frequent, rare])
+        self.assertEqual(self.found('лес', group=group), [frequent])
+        self.assertEqual(self.found('лес', author=self.author), [rare])
+
+    def test_pages_cover_results_without_gaps(self):
+        for i in range(25):
+            Post.objects.create(text='Пост номер %s про море' % i + ' море' * (i % 3), author=self.author)
+        paginator = SearchPaginator('море', 10)
+        page = paginator.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual([post.search_rank for post in seen], sorted(post.search_rank for post in seen))
+        previous = paginator.get_page(page.previous_cursor)
+        self.assertEqual(list(previous), seen[10:20])
+        self.assertEqual(list(paginator.get_page('garbage')), seen[:10])
+        for values in ([0, 10 ** 30], ['Infinity', 1], [10 ** 400, 1]):
+            cursor = base64.urlsafe_b64encode(json.dumps(['n', values]).encode()).decode()
+            with self.subTest(values=values):
+                self.assertEqual(list(paginator.get_page(cursor)), seen[:10])
+
+
+class SearchViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='username', password='password', is_staff=True,
+                                               is_superuser=True)
+        self.group = Group.objects.create(title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(text='Рецепт яблочного пирога', author=self.author, group=self.group)
+        Post.objects.create(text='Заметки о погоде', author=self.author)
+        self.client = Client()
+
+    def test_search_page_shows_matches_and_keeps_filters_in_pagination(self):
+        for i in range(10):
+            Post.objects.create(text='Ещё один пирог %s' % i, author=self.author, group=self.group)
+        response = self.client.get(reverse('search'), {'q': 'пирог', 'group': 'group'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 10)
+        self.assertNotContains(response, 'Заметки о погоде')
+        self.assertContains(response, '?q=%D0%BF%D0%B8%D1%80%D0%BE%D0%B3&amp;group=group&amp;cursor=')
+
+    def test_unknown_group_or_author_gives_empty_page(self):
+        for params in ({'group': 'missing'}, {'author': 'nobody'}, {'group': 'group', 'author': 'nobody'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('search'), dict(params, q='пирог'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context['page']), 0)
+
+    def test_empty_query_shows_only_form(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Рецепт')
+
+    def test_admin_search_uses_index(self):
+        juice = Post.objects.create(text='Яблочный сок', author=self.author)
+        self.client.force_login(self.author)
+        response = self.client.get(reverse('admin:posts_post_changelist'), {'q': 'яблочн'})
+        self.assertEqual(set(response.context['cl'].result_list), {self.post, juice})
@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from posts import thumbnails
+from posts.models import Post
+from posts.tests.utils import TempMediaMixin, small_gif
+from sorl.thumbnail import default
+
+
+User = get_user_model()
+
+
+class ContentAddressedStorageTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='username')
+        self.storage = Post._meta.get_field('image').storage
+
+    def create_post(self, name='small.gif', content=None):
+        upload = SimpleUploadedFile(name=name, content=content or small_gif(), content_type='image/gif')
+        return Post.objects.create(text='Текст', author=self.user, image=upload)
+
+    def gc(self, **options):
+        out = StringIO()
+        call_command('gc_media', min_age=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_same_content_is_stored_once(self):
+        first = self.create_post('first.gif')
+        second = self.create_post('second.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        directories, files = self.storage.listdir(first.image.name.rsplit('/', 1)[0])
+        self.assertEqual(files, [first.image.name.rsplit('/', 1)[1]])
+        other = self.create_post('first.gif', small_gif(1))
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_gc_keeps_referenced_files(self):
+        first = self.create_post()
+        second = self.create_post()
+        first.delete()
+        self.assertIn('Удалено файлов: 0, осталось: 1', self.gc())
+        self.assertTrue(self.storage.exists(second.image.name))
+
+    def test_gc_removes_orphans_with_their_thumbnails(self):
+        post = self.create_post()
+        name = post.image.name
+        geometry, options = thumbnails.CARD
+        thumbnail = thumbnails._thumbnail_file(post.image, geometry, options)
+        default.storage.save(thumbnail.name, ContentFile(b'thumbnail'))
+        thumbnail.set_size((960, 339))
+        source = thumbnails.source_file(post.image)
+        source.set_size((2, 1))
+        default.kvstore.set(source)
+        default.kvstore.set(thumbnail, source)
+        post.delete()
+
+        self.assertIn('Удалено файлов: 1', self.gc(dry_run=True))
+        self.assertTrue(self.storage.exists(name))
+
+        self.assertIn('Удалено файлов: 1, осталось: 0', self.gc())
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(default.storage.exists(thumbnail.name))
+        self.assertIsNone(default.kvstore.get(thumbnail))
+
+    def test_gc_spares_fresh_files(self):
+        post = self.create_post()
+        post.delete()
+        out = StringIO()
+        call_command('gc_media', stdout=out)
+        self.assertIn('Удалено файлов: 0, осталось: 1', out.getvalue())
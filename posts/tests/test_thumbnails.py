@@ -0,0 +1,218 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts import thumbnails
+from posts.models import Post
+from posts.tests.utils import TempMediaMixin, small_gif
+from sorl.thumbnail import default
+
+
+User = get_user_model()
+
+
+def store_thumbnails(image, sizes=thumbnails.SIZES):
+    # Записи, которые оставил бы get_thumbnail после нарезки
+    stored = []
+    for geometry, options in sizes:
+        thumbnail = thumbnails._thumbnail_file(image, geometry, options)
+        thumbnail.set_size(tuple(int(side) for side in geometry.split('x')))
+        default.kvstore.set(thumbnail)
+        stored.append(thumbnail)
+    return stored
+
+
+def generated_sizes(get_thumbnail):
+    return {(call[0][1], call[1]['format']) for call in get_thumbnail.call_args_list}
+
+
+ALL_SIZES = {(geometry, options['format']) for geometry, options in thumbnails.SIZES}
+
+
+class SynchronousExecutor:
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class ThumbnailPregenerationTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='username')
+        self.client = Client()
+        self.client.force_login(self.user)
+        # В TestCase транзакция не коммитится, поэтому on_commit и пул
+        # выполняем сразу
+        for target, value in (
+            ('posts.thumbnails.transaction.on_commit', mock.Mock(side_effect=lambda func: func())),
+            ('posts.thumbnails._get_executor', mock.Mock(return_value=SynchronousExecutor())),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upload(self, name='small.gif', color=0):
+        return SimpleUploadedFile(name=name, content=small_gif(color), content_type='image/gif')
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_new_post_with_image_pregenerates_all_sizes(self, get_thumbnail):
+        self.client.post(reverse('new_post'), {'text': 'Текст', 'image': self.upload()})
+        post = Post.objects.get()
+        self.assertEqual(generated_sizes(get_thumbnail), ALL_SIZES)
+        self.assertEqual({call[0][0].name for call in get_thumbnail.call_args_list}, {post.image.name})
+        self.assertIn(
+            ('960x339', {'crop': 'center', 'upscale': True, 'format': 'JPEG'}),
+            [(call[0][1], call[1]) for call in get_thumbnail.call_args_list])
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_edit_pregenerates_only_new_image(self, get_thumbnail):
+        post = Post.objects.create(text='Текст', author=self.user, image=self.upload())
+        url = reverse('post_edit', args=['username', post.id])
+        self.client.post(url, {'text': 'Новый текст'})
+        get_thumbnail.assert_not_called()
+        self.client.post(url, {'text': 'Новый текст', 'image': self.upload('other.gif')})
+        post.refresh_from_db()
+        self.assertEqual({call[0][0].name for call in get_thumbnail.call_args_list}, {post.image.name})
+        self.assertEqual(get_thumbnail.call_count, len(thumbnails.SIZES))
+
+    @mock.patch('posts.thumbnails.get_thumbnail', side_effect=OSError)
+    def test_background_failure_does_not_break_request(self, get_thumbnail):
+        response = self.client.post(reverse('new_post'), {'text': 'Текст', 'image': self.upload()})
+        self.assertRedirects(response, reverse('index'))
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_warm_command_covers_every_image(self, get_thumbnail):
+        Post.objects.create(text='Первый', author=self.user, image=self.upload())
+        Post.objects.create(text='Второй', author=self.user, image=self.upload(color=255))
+        Post.objects.create(text='Без картинки', author=self.user)
+        out = StringIO()
+        call_command('warm_thumbnails', processes=1, chunk_size=1, stdout=out)
+        names = {call[0][0].name for call in get_thumbnail.call_args_list}
+        self.assertEqual(names, set(Post.objects.exclude(image='').values_list('image', flat=True)))
+        self.assertIn('Картинок обработано: 2', out.getvalue())
+
+
+class ThumbnailResolveTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='username')
+        self.posts = [
+            Post.objects.create(
+                text='Текст', author=self.user,
+                image=SimpleUploadedFile(name='small%s.gif' % i, content=small_gif(i), content_type='image/gif'))
+            for i in range(3)
+        ]
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_page_is_resolved_with_one_lookup(self, get_thumbnail):
+        stored = {
+            post.image.name: [thumbnail.url for thumbnail in store_thumbnails(post.image)]
+            for post in self.posts
+        }
+        cache.clear()
+        with self.assertNumQueries(1):
+            resolved = thumbnails.resolve(post.image for post in self.posts)
+        self.assertEqual(
+            {name: [image.url for image in images] for name, images in resolved.items()}, stored)
+        with self.assertNumQueries(0):
+            thumbnails.resolve(post.image for post in self.posts)
+        get_thumbnail.assert_not_called()
+
+    @mock.patch('posts.thumbnails._get_executor')
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_missing_thumbnail_is_queued_not_generated(self, get_thumbnail, get_executor):
+        store_thumbnails(self.posts[0].image)
+        store_thumbnails(self.posts[1].image, thumbnails.SIZES[1:])
+        for _ in range(2):
+            resolved = thumbnails.resolve(post.image for post in self.posts[:2])
+        get_thumbnail.assert_not_called()
+        self.assertIsNone(resolved[self.posts[1].image.name][0])
+        self.assertNotIn(None, resolved[self.posts[0].image.name])
+        # Повторный промах не ставит картинку в очередь второй раз
+        get_executor.return_value.submit.assert_called_once_with(
+            thumbnails._generate_in_background, self.posts[1].image.name, self.posts[1].image_size)
+
+    @mock.patch('posts.thumbnails._get_executor')
+    def test_cards_without_all_thumbnails_are_not_cached(self, get_executor):
+        jpeg = [size for size in thumbnails.SIZES if size[1]['format'] == 'JPEG']
+        for post in self.posts:
+            store_thumbnails(post.image, jpeg)
+        response = Client().get(reverse('index'))
+        self.assertNotContains(response, 'image/webp')
+        for post in self.posts:
+            store_thumbnails(post.image)
+        response = Client().get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"', count=len(self.posts))
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_feed_cards_render_responsive_pictures(self, get_thumbnail):
+        stored = [store_thumbnails(post.image) for post in self.posts]
+        response = Client().get(reverse('index'))
+        for thumbnails_of_post in stored:
+            webp = [thumbnail for thumbnail in thumbnails_of_post if thumbnail.name.endswith('.webp')]
+            self.assertContains(response, '<source type="image/webp" srcset="%s 480w, %s 720w, %s 960w"' % tuple(
+                thumbnail.url for thumbnail in webp))
+            self.assertContains(response, 'src="%s"' % thumbnails_of_post[-1].url)
+        get_thumbnail.assert_not_called()
+
+    @mock.patch('posts.thumbnails.get_thumbnail')
+    def test_post_page_renders_picture(self, get_thumbnail):
+        post = self.posts[0]
+        stored = store_thumbnails(post.image)
+        response = Client().get(reverse('post', args=['username', post.id]))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '%s 480w' % stored[-3].url)
+        get_thumbnail.assert_not_called()
+
+
+class ImageSizeTests(TempMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username='username')
+
+    def upload(self, name='small.gif', color=0):
+        return SimpleUploadedFile(name=name, content=small_gif(color), content_type='image/gif')
+
+    def test_size_is_stored_on_upload_and_forgotten_with_image(self):
+        post = Post.objects.create(text='Текст', author=self.user, image=self.upload())
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        post.text = 'Новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_size, (2, 1))
+        post.image = 'posts/other.gif'
+        post.save()
+        self.assertIsNone(post.image_size)
+        post.image = None
+        post.save()
+        self.assertIsNone(post.image_width)
+
+    def test_backfill_reads_sizes_of_existing_files(self):
+        stored = Post.objects.create(text='Текст', author=self.user, image=self.upload())
+        Post.objects.filter(pk=stored.pk).update(image_width=None, image_height=None)
+        missing = Post.objects.create(text='Текст', author=self.user, image='posts/missing.gif')
+        out, err = StringIO(), StringIO()
+        call_command('backfill_image_sizes', batch_size=1, stdout=out, stderr=err)
+        stored.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertEqual(stored.image_size, (2, 1))
+        self.assertIsNone(missing.image_width)
+        self.assertIn('Записаны размеры: 1, пропущено: 1', out.getvalue())
+        self.assertIn(str(missing.id), err.getvalue())
+
+    def test_feed_images_are_sized_and_lazy(self):
+        post = Post.objects.create(text='Текст', author=self.user, image=self.upload())
+        store_thumbnails(post.image)
+        response = Client().get(reverse('index'))
+        self.assertContains(response, 'width="960" height="339" loading="lazy"')
@@ -8,6 +8,7 @@ import tempfile
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from unittest import mock
 
 
 User = get_user_model()
@@ -54,6 +55,10 @@ class PostViewsTests(TestCase):
         super().tearDownClass()
 
     def setUp(self):
+        # Нарезка миниатюр уходит в фоновый пул: здесь она не нужна
+        patcher = mock.patch('posts.thumbnails.queue')
+        patcher.start()
+        self.addCleanup(patcher.stop)
         # Создаем авторизованный клиент
         self.guest_client = Client()
         self.user = User.objects.create_user(username='Sonya')
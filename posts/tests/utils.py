@@ -0,0 +1,25 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.test import override_settings
+from PIL import Image
+
+
+def small_gif(color=0):
+    # Разный цвет - разное содержимое: одинаковые файлы хранилище склеивает
+    buffer = BytesIO()
+    Image.new('RGB', (2, 1), (color, 0, 0)).save(buffer, 'GIF')
+    return buffer.getvalue()
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT во временном каталоге, который удаляется после теста."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
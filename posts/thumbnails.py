@@ -0,0 +1,212 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Варианты картинки карточки для <picture>/srcset (posts/picture.html):
+# ступени по ширине с пропорциями 960x339, каждая в WebP и JPEG.
+CARD_WIDTHS = (480, 720, 960)
+CARD_FORMATS = (('WEBP', 'image/webp'), ('JPEG', 'image/jpeg'))
+CARD_SIZES_ATTR = '(max-width: 960px) 100vw, 960px'
+
+
+def _card_size(width, image_format):
+    geometry = '%sx%s' % (width, round(width * 339 / 960))
+    return geometry, {'crop': 'center', 'upscale': True, 'format': image_format}
+
+
+CARD_VARIANTS = [
+    (mime, width, _card_size(width, image_format))
+    for image_format, mime in CARD_FORMATS
+    for width in CARD_WIDTHS
+]
+# Запасной <img src> для браузеров без srcset и для {% thumbnail %} в
+# post_card.html; совпадает с самым широким JPEG-вариантом
+CARD = _card_size(CARD_WIDTHS[-1], 'JPEG')
+
+# Все размеры, в которых шаблоны выводят Post.image. Меняя шаблоны, меняйте
+# и этот список, иначе новых размеров не будет до фоновой нарезки.
+SIZES = [size for mime, width, size in CARD_VARIANTS]
+
+WORKERS = getattr(settings, 'THUMBNAIL_WORKERS', 2)
+# Сколько картинка считается стоящей в очереди, если нарезка не сообщила
+# о завершении (например, процесс перезапустили)
+QUEUE_TTL = getattr(settings, 'THUMBNAIL_QUEUE_TTL', 10 * 60)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='thumbnails')
+    return _executor
+
+
+def source_file(image):
+    """Исходник для sorl-thumbnail по FieldFile или имени картинки поста.
+
+    Всегда в хранилище поля Post.image: от класса хранилища зависят ключи
+    и имена миниатюр, и по имени они должны совпасть с нарезанными по FieldFile.
+    """
+    return ImageFile(getattr(image, 'name', image), Post._meta.get_field('image').storage)
+
+
+def _remember_source_size(image, size):
+    # Если файл миниатюры уже есть, а записи о нём нет, get_thumbnail
+    # открывает исходник только ради его размеров; известные размеры
+    # кладём в хранилище ключей заранее
+    if size:
+        source = source_file(image)
+        source.set_size(size)
+        default.kvstore.get_or_set(source)
+
+
+def generate(image, size=None):
+    """Нарезает все SIZES для картинки (FieldFile или имя в хранилище).
+    Уже готовые миниатюры sorl-thumbnail находит в своём хранилище ключей
+    и не пересоздаёт. size - размеры исходника, если известны (для FieldFile
+    берутся из поста)."""
+    post = getattr(image, 'instance', None)
+    _remember_source_size(image, size or (post.image_size if post is not None else None))
+    for geometry, options in SIZES:
+        get_thumbnail(source_file(image), geometry, **options)
+
+
+def _queued_key(name):
+    return 'thumbnails:queued:%s' % hashlib.md5(name.encode()).hexdigest()
+
+
+def _generate_in_background(name, size):
+    try:
+        generate(name, size)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры для %s', name)
+    finally:
+        cache.delete(_queued_key(name))
+        # Поток пула живёт долго: соединения с базой (хранилище ключей
+        # sorl-thumbnail) закрываем сами
+        connections.close_all()
+
+
+def queue(name, size=None):
+    """Ставит нарезку всех SIZES картинки в фоновый пул. Пока картинка
+    в очереди, повторные вызовы из любого процесса ничего не делают."""
+    if cache.add(_queued_key(name), 1, QUEUE_TTL):
+        _get_executor().submit(_generate_in_background, name, size)
+
+
+def pregenerate(post):
+    """Ставит нарезку миниатюр поста в фоновый пул после коммита, чтобы
+    её не ждал ни автор, ни первый читатель ленты."""
+    if not post.image:
+        return
+    name, size = post.image.name, post.image_size
+    transaction.on_commit(lambda: queue(name, size))
+
+
+def _thumbnail_file(image, geometry, options):
+    """ImageFile миниатюры с тем же именем, что даст get_thumbnail, но без
+    обращений к хранилищу файлов и хранилищу ключей."""
+    backend = default.backend
+    source = source_file(image)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(backend._get_thumbnail_filename(source, geometry, options), default.storage)
+
+
+def _get_many_raw(keys):
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if not isinstance(found.get(key), str)]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        found.update(stored)
+    return found
+
+
+def resolve(images, sizes=SIZES):
+    """Миниатюры картинок страницы: {имя картинки: [ImageFile или None по sizes]}.
+
+    Вместо обращения к хранилищу ключей sorl-thumbnail на каждую миниатюру -
+    один get_many по кэшу и не больше одного запроса к базе за промахами.
+    Миниатюр, которых ещё нет, в ответе нет (None): ответ их не ждёт,
+    а картинка ставится в фоновую нарезку (см. queue).
+    """
+    images = {image.name: image for image in images if image}
+    keys = {
+        (name, index): add_prefix(_thumbnail_file(image, geometry, options).key)
+        for name, image in images.items()
+        for index, (geometry, options) in enumerate(sizes)
+    }
+    raw = _get_many_raw(list(keys.values()))
+    resolved = {}
+    for name, image in images.items():
+        values = [raw.get(keys[name, index]) for index in range(len(sizes))]
+        resolved[name] = [deserialize_image_file(value) if isinstance(value, str) else None for value in values]
+        if None in resolved[name]:
+            post = getattr(image, 'instance', None)
+            queue(name, post.image_size if post is not None else None)
+    return resolved
+
+
+class Picture:
+    """Варианты одной картинки для posts/picture.html: <source> по форматам
+    со srcset по ширине и запасной <img>. Выводит только уже нарезанные
+    варианты; complete - нарезаны все."""
+
+    sizes = CARD_SIZES_ATTR
+
+    def __init__(self, variants):
+        # variants - [(mime, ширина, ImageFile)] в порядке CARD_VARIANTS
+        self.src = None
+        self.complete = True
+        srcsets = {}
+        for mime, width, thumbnail in variants:
+            if thumbnail is None:
+                self.complete = False
+                continue
+            srcsets.setdefault(mime, []).append('%s %sw' % (thumbnail.url, width))
+            if mime == 'image/jpeg':
+                self.src = thumbnail
+        self.srcset = ', '.join(srcsets.pop('image/jpeg', []))
+        self.sources = [(mime, ', '.join(srcset)) for mime, srcset in srcsets.items()]
+
+    def __bool__(self):
+        return self.src is not None
+
+
+def pictures(images):
+    """{имя картинки: Picture} для всех картинок страницы, см. resolve."""
+    resolved = resolve(images, [size for mime, width, size in CARD_VARIANTS])
+    return {
+        name: Picture([
+            (mime, width, thumbnail)
+            for (mime, width, size), thumbnail in zip(CARD_VARIANTS, thumbnails)
+        ])
+        for name, thumbnails in resolved.items()
+    }
@@ -5,14 +5,21 @@ from . import views
 urlpatterns = [
     path("", views.index, name="index"),
     path('group/<slug:slug>/', views.group_posts, name="group_posts"),
+    path('group/<slug:slug>/rss/', views.group_rss, name="group_rss"),
+    path('group/<slug:slug>/atom/', views.group_atom, name="group_atom"),
     path('new/', views.new_post, name="new_post"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search_posts, name="search"),
     path('<str:username>/', views.profile, name="profile"),
+    path('<str:username>/export/', views.profile_export, name="profile_export"),
+    path('<str:username>/rss/', views.author_rss, name="author_rss"),
+    path('<str:username>/atom/', views.author_atom, name="author_atom"),
     path('<str:username>/<int:post_id>/', views.post_view, name="post"),
     path('<str:username>/<int:post_id>/edit/', views.post_edit, name="post_edit"),
     path("404/", views.page_not_found),
     path("500/", views.server_error),
     path("<str:username>/<int:post_id>/comment/", views.add_comment, name="add_comment"),
+    path("<str:username>/<int:post_id>/comments/", views.post_comments, name="post_comments"),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"),
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow")
 ]
@@ -1,25 +1,113 @@
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from .pagination import CursorPaginator, InvalidCursor
+from . import caching, counters, export, feed, feeds, search, thumbnails
 
+COMMENTS_PER_PAGE = getattr(settings, 'COMMENTS_PER_PAGE', 50)
 
+
+def index_scopes(request):
+    return [caching.INDEX]
+
+
+@caching.conditional_page(index_scopes)
 def index(request):
-    latest = Post.objects.get_queryset().order_by('pub_date')
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'posts/index.html', {'page': page, 'paginator': paginator})
+    caching.add_surrogate_keys(request, caching.INDEX)
+    latest = Post.objects.for_feed()
+    paginator = CursorPaginator(latest, 10)
+    page, generation = caching.feed_page(request, paginator, caching.INDEX)
+    caching.add_surrogate_keys(request, *[caching.post_scope(post.id) for post in page])
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'cache_generation': generation,
+        'cache_ttl': caching.fragment_ttl()
+    }
+    return render(request, 'posts/index.html', context)
 
 
+def group_scopes(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list('id', flat=True).first()
+    if group_id is None:
+        return None
+    return [caching.group_scope(group_id)]
+
+
+@caching.conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.get_queryset().order_by('pub_date').filter(group=group)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'posts/group.html', {"group": group, "page": page, 'paginator': paginator})
+    caching.add_surrogate_keys(request, caching.group_scope(group.id))
+    posts = Post.objects.for_feed().filter(group=group)
+    paginator = CursorPaginator(posts, 10)
+    page, generation = caching.feed_page(request, paginator, caching.group_scope(group.id))
+    caching.add_surrogate_keys(request, *[caching.post_scope(post.id) for post in page])
+    context = {
+        "group": group,
+        "page": page,
+        'paginator': paginator,
+        'cache_generation': generation,
+        'cache_ttl': caching.fragment_ttl()
+    }
+    return render(request, 'posts/group.html', context)
+
+
+def search_posts(request):
+    text = request.GET.get('q', '').strip()
+    group = author = None
+    unknown_filter = False
+    if request.GET.get('group'):
+        group = Group.objects.filter(slug=request.GET['group']).first()
+        unknown_filter = group is None
+    if request.GET.get('author'):
+        author = User.objects.filter(username=request.GET['author']).first()
+        unknown_filter = unknown_filter or author is None
+    if unknown_filter:
+        # Фильтр по несуществующей группе или автору - пустая выдача,
+        # а не поиск по всем постам без фильтра
+        paginator = CursorPaginator(Post.objects.none(), 10)
+    elif search.available():
+        paginator = search.SearchPaginator(text, 10, group=group, author=author)
+    else:
+        # Без FTS5 - простой поиск по подстроке в порядке ленты
+        posts = Post.objects.for_feed().filter(text__icontains=text) if text else Post.objects.none()
+        if group is not None:
+            posts = posts.filter(group=group)
+        if author is not None:
+            posts = posts.filter(author=author)
+        paginator = CursorPaginator(posts, 10)
+    page = paginator.get_page(request.GET.get('cursor'))
+    # Ссылки паджинатора должны сохранять запрос и фильтры
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'text': text,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.order_by('title'),
+        'query': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def author_feed_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if author_id is None:
+        return None
+    return [caching.profile_scope(author_id)]
+
+
+# RSS и Atom: ETag/304 и кэш страниц для гостей - как у HTML-лент
+group_rss = caching.conditional_page(group_scopes)(feeds.GroupFeed())
+group_atom = caching.conditional_page(group_scopes)(feeds.GroupAtomFeed())
+author_rss = caching.conditional_page(author_feed_scopes)(feeds.AuthorFeed())
+author_atom = caching.conditional_page(author_feed_scopes)(feeds.AuthorAtomFeed())
 
 
 @login_required
@@ -29,18 +117,34 @@ def new_post(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            form.save()
+            with transaction.atomic():
+                form.save()
+                counters.post_created(post)
+                thumbnails.pregenerate(post)
             return redirect('index')
         return render(request, 'posts/new.html', {'form': form})
     return render(request, 'posts/new.html', {'form': form})
 
 
+def profile_scopes(request, username):
+    author_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+    if author_id is None:
+        return None
+    scopes = [caching.profile_scope(author_id), caching.stats_scope(author_id)]
+    if request.user.is_authenticated:
+        # Кнопка "Подписаться"/"Отписаться" зависит от подписок читателя
+        scopes.append(caching.follow_scope(request.user.id))
+    return scopes
+
+
+@caching.conditional_page(profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    author_posts = author.posts.get_queryset().order_by('pub_date')
-    paginator = Paginator(author_posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    caching.add_surrogate_keys(request, caching.profile_scope(author.id), caching.stats_scope(author.id))
+    author_posts = Post.objects.for_feed().filter(author=author)
+    paginator = CursorPaginator(author_posts, 10)
+    page, generation = caching.feed_page(request, paginator, caching.profile_scope(author.id))
+    caching.add_surrogate_keys(request, *[caching.post_scope(post.id) for post in page])
     if (request.user.is_authenticated and request.user != author and (
             Follow.objects.filter(user=request.user, author=author).exists())):
         following = True
@@ -49,21 +153,108 @@ def profile(request, username):
     context = {
         'page': page,
         'author': author,
+        'stats': counters.stats_for(author),
         'author_posts': author_posts,
         'paginator': paginator,
-        'following': following
+        'following': following,
+        'cache_generation': generation,
+        'cache_ttl': caching.fragment_ttl()
     }
     return render(request, 'posts/profile.html', context)
 
 
+@login_required
+def profile_export(request, username):
+    # Выгрузить можно только свои данные
+    if request.user.username != username:
+        return redirect('profile', username=username)
+    if request.GET.get('format') == 'zip':
+        response = StreamingHttpResponse(export.zip_archive(request.user), content_type='application/zip')
+        filename = '%s.zip' % username
+    else:
+        response = StreamingHttpResponse(export.ndjson(request.user), content_type='application/x-ndjson')
+        filename = '%s.ndjson' % username
+    response['Content-Disposition'] = 'attachment; filename="%s"' % filename
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+def post_scopes(request, username, post_id):
+    author_id = Post.objects.filter(id=post_id).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [caching.post_scope(post_id), caching.stats_scope(author_id)]
+
+
+@caching.conditional_page(post_scopes)
 def post_view(request, username, post_id):
+    caching.add_surrogate_keys(request, caching.post_scope(post_id))
     post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = post.comments.all()
+    caching.add_surrogate_keys(request, caching.stats_scope(post.author_id))
+    try:
+        comments_page, comments = comment_page(post, request.GET.get('cursor'))
+    except InvalidCursor:
+        # Как get_page: битый курсор в адресе поста - начало обсуждения
+        comments_page, comments = comment_page(post)
+    picture = thumbnails.pictures([post.image]).get(post.image.name)
+    if picture is not None and not picture.complete:
+        caching.mark_incomplete(request)
     form = CommentForm(request.POST or None)
-    context = {'author': post.author, 'post': post, 'form': form, 'comments': comments}
+    context = {
+        'author': post.author,
+        'stats': counters.stats_for(post.author),
+        'post': post,
+        'picture': picture,
+        'form': form,
+        'comments': comments,
+        'comments_page': comments_page,
+    }
     return render(request, 'posts/post.html', context)
 
 
+class CommentsPaginator(CursorPaginator):
+    """От старых к новым по индексу (post, created, id), авторы - тем же
+    запросом. Запоминает QuerySet, из которого прочитана страница."""
+
+    def __init__(self, comments):
+        super().__init__(comments, COMMENTS_PER_PAGE, ordering=('created', 'id'))
+        self.queryset = comments.none()
+
+    def fetch(self, values, forward):
+        self.queryset = self.query(values, forward)
+        return list(self.queryset)
+
+
+def comment_page(post, cursor=None):
+    """Страница комментариев поста одним запросом и уже выполненный QuerySet
+    этого запроса (шаблоны ждут комментарии QuerySet'ом; выводится страница:
+    в запросе есть лишняя строка-признак продолжения). Битый курсор -
+    InvalidCursor."""
+    paginator = CommentsPaginator(post.comments.select_related('author'))
+    page = paginator.page(cursor)
+    return page, paginator.queryset
+
+
+@caching.conditional_page(post_scopes)
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев фрагментом HTML для кнопки "Показать ещё"."""
+    caching.add_surrogate_keys(request, caching.post_scope(post_id))
+    post = get_object_or_404(Post.objects.select_related('author'), author__username=username, id=post_id)
+    try:
+        comments_page, comments = comment_page(post, request.GET.get('cursor'))
+    except InvalidCursor:
+        # Фрагмент дописывается к уже показанным комментариям: начало
+        # обсуждения вместо него задвоило бы их
+        raise Http404('Неверный курсор')
+    context = {
+        'post': post,
+        'author': post.author,
+        'comments': comments,
+        'comments_page': comments_page,
+    }
+    return render(request, 'posts/comment_list.html', context)
+
+
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
@@ -72,6 +263,8 @@ def post_edit(request, username, post_id):
     form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.pregenerate(post)
         return redirect('post', username=username, post_id=post_id)
     return render(request, 'posts/new.html', {'post': post, 'form': form, 'edit': True})
 
@@ -99,28 +292,35 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        form.save()
+        with transaction.atomic():
+            form.save()
+            counters.comment_created(comment)
     return redirect('post', username, post.id)
 
 
 @login_required
 def follow_index(request):
-    follow_list = Post.objects.filter(author__following__user=request.user).order_by('pub_date')
-    paginator = Paginator(follow_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, "follow.html", {'page': page, 'paginator': paginator})
+    paginator = feed.follow_paginator(request.user, 10)
+    page = paginator.get_page(request.GET.get('cursor'))
+    context = {
+        'page': page,
+        'paginator': paginator,
+        'cache_generation': caching.follow_generation(request.user),
+        'cache_ttl': caching.fragment_ttl()
+    }
+    return render(request, "follow.html", context)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        feed.follow(request.user, author)
     return redirect('profile', username=author.username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    Follow.objects.filter(author__username=username).filter(user=request.user).delete()
+    author = get_object_or_404(User, username=username)
+    feed.unfollow(request.user, author)
     return redirect('profile', username=username)
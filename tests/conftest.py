@@ -1,4 +1,13 @@
+import pytest
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Кэш страниц и поколений переживает очистку базы между тестами
+    from django.core.cache import cache
+    cache.clear()
@@ -3,7 +3,7 @@ import tempfile
 
 import pytest
 from django.contrib.auth import get_user_model
-from django.core.paginator import Page, Paginator
+from posts.pagination import CursorPage, CursorPaginator
 from django.db.models import fields
 
 try:
@@ -123,14 +123,14 @@ class TestFollow:
         assert 'paginator' in response.context, (
             'Проверьте, что передали переменную `paginator` в контекст страницы `/follow/`'
         )
-        assert type(response.context['paginator']) == Paginator, (
-            'Проверьте, что переменная `paginator` на странице `/follow/` типа `Paginator`'
+        assert isinstance(response.context['paginator'], CursorPaginator), (
+            'Проверьте, что переменная `paginator` на странице `/follow/` типа `CursorPaginator`'
         )
         assert 'page' in response.context, (
             'Проверьте, что передали переменную `page` в контекст страницы `/follow/`'
         )
-        assert type(response.context['page']) == Page, (
-            'Проверьте, что переменная `page` на странице `/follow/` типа `Page`'
+        assert type(response.context['page']) == CursorPage, (
+            'Проверьте, что переменная `page` на странице `/follow/` типа `CursorPage`'
         )
         assert len(response.context['page']) == 2, (
             'Проверьте, что на странице `/follow/` список статей авторов на которых подписаны'
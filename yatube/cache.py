@@ -0,0 +1,212 @@
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+_MISSING = object()
+# Кэши, которые живут внутри процесса: общим уровнем они быть не могут
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: маленький LRU в памяти процесса перед общим кэшем.
+
+    Общий уровень (OPTIONS['SHARED'], описание кэша как в CACHES) один на
+    все процессы; локальный ограничен числом записей (LOCAL_MAX_ENTRIES)
+    и временем жизни (LOCAL_TIMEOUT), поэтому чужую запись процесс увидит
+    не позже чем через LOCAL_TIMEOUT секунд.
+
+    Ключи с префиксами из SHARED_ONLY_PREFIXES (поколения областей, см.
+    posts/caching.py) в локальный уровень не попадают: смена поколения в
+    любом процессе видна сразу, а фрагменты под старым поколением просто
+    перестают запрашиваться и вытесняются. Запись, удаление, incr и смена
+    версии ключа сбрасывают его локальную копию.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        shared = dict(options['SHARED'])
+        self.shared = import_string(shared.pop('BACKEND'))(shared.pop('LOCATION', ''), shared)
+        self.local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self.shared_only_prefixes = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        if self.shared_only_prefixes:
+            self._check_shared(options.get('ALLOW_PROCESS_LOCAL', False))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def _check_shared(self, allow_process_local):
+        backend = type(self.shared).__name__
+        prefixes = ', '.join(self.shared_only_prefixes)
+        if isinstance(self.shared, PROCESS_LOCAL_BACKENDS) and not allow_process_local:
+            # Смена поколения или блокировка в одном процессе не видна
+            # остальным: они отдавали бы устаревшие страницы весь TTL
+            raise ImproperlyConfigured(
+                'Кэш %s живёт внутри процесса и не может быть общим уровнем для ключей %s. '
+                'Нужен memcached или redis; ALLOW_PROCESS_LOCAL - только для одного процесса.'
+                % (backend, prefixes))
+        if type(self.shared).incr is BaseCache.incr:
+            # incr из BaseCache - это get и set: два процесса, поднявшие
+            # поколение одновременно, получат одно и то же значение
+            raise ImproperlyConfigured(
+                'Общий кэш %s не поддерживает атомарный incr, а на нём держатся ключи %s.'
+                % (backend, prefixes))
+
+    def stats(self):
+        """Попадания и промахи по уровням в этом процессе."""
+        with self._lock:
+            return {
+                tier: {'hits': self._stats[tier, 'hits'], 'misses': self._stats[tier, 'misses']}
+                for tier in ('local', 'shared')
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    def _count(self, tier, hits, misses):
+        with self._lock:
+            self._stats[tier, 'hits'] += hits
+            self._stats[tier, 'misses'] += misses
+
+    def _is_local(self, key):
+        return self.local_max_entries > 0 and not key.startswith(self.shared_only_prefixes)
+
+    def _local_get(self, key, version):
+        local_key = self.make_key(key, version)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[local_key]
+                return _MISSING
+            self._local.move_to_end(local_key)
+        return pickle.loads(value)
+
+    def _local_set(self, key, value, timeout, version):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        if timeout is not None and timeout <= 0:
+            self._local_delete(key, version)
+            return
+        ttl = self.local_timeout if timeout is None else min(self.local_timeout, timeout)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        local_key = self.make_key(key, version)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        with self._lock:
+            self._local.pop(self.make_key(key, version), None)
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            value = self._local_get(key, version)
+            if value is not _MISSING:
+                self._count('local', 1, 0)
+                return value
+            self._count('local', 0, 1)
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('shared', 0, 1)
+            return default
+        self._count('shared', 1, 0)
+        if self._is_local(key):
+            self._local_set(key, value, self.local_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._local_get(key, version) if self._is_local(key) else _MISSING
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        local_keys = len([key for key in keys if self._is_local(key)])
+        self._count('local', len(found), local_keys - len(found))
+        if remote:
+            fetched = self.shared.get_many(remote, version=version)
+            self._count('shared', len(fetched), len(remote) - len(fetched))
+            for key, value in fetched.items():
+                if self._is_local(key):
+                    self._local_set(key, value, self.local_timeout, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._local_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version) or []
+        for key, value in data.items():
+            if key in failed:
+                self._local_delete(key, version)
+            elif self._is_local(key):
+                self._local_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added and self._is_local(key):
+            self._local_set(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(key, version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_get(key, version) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        self._local_delete(key, version)
+        return self.shared.decr(key, delta, version=version)
+
+    def incr_version(self, key, delta=1, version=None):
+        if version is None:
+            version = self.version
+        self._local_delete(key, version)
+        return self.shared.incr_version(key, delta, version=version)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def clear(self):
+        self.clear_local()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,153 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+CHUNK_SIZE = 64 * 1024
+# Имена с хэшем содержимого или ключа (ManifestStaticFilesStorage,
+# posts/storage.py, миниатюры sorl-thumbnail) никогда не меняют содержимое
+HASHED_NAME = re.compile(r'(^|\.)[0-9a-f]{12,}\.\w+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+SENDFILE_BACKEND = getattr(settings, 'SENDFILE_BACKEND', None)
+# Ключи приводим через realpath: иначе корень со слэшем на конце или
+# через симлинк не совпал бы с document_root из urls.py
+SENDFILE_ACCEL_PREFIXES = {
+    os.path.realpath(root): prefix for root, prefix in getattr(settings, 'SENDFILE_ACCEL_PREFIXES', {}).items()
+}
+
+
+def serve_urls(prefix, document_root):
+    """Как django.conf.urls.static.static(), но с serve из этого модуля
+    и независимо от DEBUG."""
+    if SENDFILE_BACKEND == 'x-accel-redirect' and _accel_prefix(document_root) is None:
+        raise ImproperlyConfigured(
+            'Для %s нет внутреннего адреса nginx в SENDFILE_ACCEL_PREFIXES.' % document_root)
+    return [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(prefix.lstrip('/')), serve, {'document_root': document_root}),
+    ]
+
+
+@require_safe
+def serve(request, path, document_root):
+    """Отдаёт файл из document_root.
+
+    Поддерживает условные запросы (ETag, Last-Modified), один диапазон
+    байтов в Range (с If-Range) и вечное кэширование файлов с хэшем в имени.
+    При SENDFILE_BACKEND тело отдаёт веб-сервер: 'x-sendfile' (Apache,
+    lighttpd) или 'x-accel-redirect' (nginx, внутренние адреса из
+    SENDFILE_ACCEL_PREFIXES).
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(document_root, path)
+        stat_result = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден')
+
+    size = stat_result.st_size
+    etag = '"%x-%x"' % (stat_result.st_mtime_ns, size)
+    last_modified = http_date(stat_result.st_mtime)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat_result.st_mtime))
+    if response is None:
+        response = _file_response(request, fullpath, path, document_root, size, etag, stat_result)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = IMMUTABLE if HASHED_NAME.search(posixpath.basename(path)) else REVALIDATE
+    return response
+
+
+def _file_response(request, fullpath, path, document_root, size, etag, stat_result):
+    content_type, encoding = mimetypes.guess_type(fullpath)
+    content_type = content_type or 'application/octet-stream'
+
+    accel_prefix = _accel_prefix(document_root) if SENDFILE_BACKEND == 'x-accel-redirect' else None
+    if accel_prefix is not None or SENDFILE_BACKEND == 'x-sendfile':
+        # Диапазоны и передачу файла берёт на себя веб-сервер
+        response = HttpResponse(content_type=content_type)
+        if accel_prefix is not None:
+            # nginx раскодирует адрес сам; без quote пробел или перевод
+            # строки в имени сломали бы заголовок
+            response['X-Accel-Redirect'] = accel_prefix + quote(path)
+        else:
+            response['X-Sendfile'] = fullpath
+    else:
+        # Корень без внутреннего адреса nginx отдаём сами
+        byte_range = _parse_range(request, size, etag, stat_result)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%s' % size
+            return response
+        if byte_range is None:
+            # FileResponse отдаёт файл через wsgi.file_wrapper (sendfile у сервера)
+            response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fullpath, start, end), status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes %s-%s/%s' % (start, end, size)
+            response['Content-Length'] = end - start + 1
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _accel_prefix(document_root):
+    return SENDFILE_ACCEL_PREFIXES.get(os.path.realpath(document_root))
+
+
+def _parse_range(request, size, etag, stat_result):
+    """(начало, конец) включительно, None - отдать файл целиком,
+    'unsatisfiable' - для ответа 416. Несколько диапазонов не поддерживаем
+    и отдаём весь файл, как разрешает RFC 7233."""
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != int(stat_result.st_mtime):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500: последние 500 байт
+        length = int(end)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(size - length, 0), size - 1
+    start = int(start)
+    if end and start > int(end):
+        # bytes=500-3 синтаксически неверен: заголовок игнорируем (RFC 7233, 2.1)
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def _read_range(fullpath, start, end):
+    with open(fullpath, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -55,6 +57,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -138,6 +142,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# MEDIA_ROOT и STATIC_ROOT отдаёт само приложение (yatube/files.py).
+# SENDFILE_BACKEND: None - файл передаёт Django, 'x-sendfile' - Apache или
+# lighttpd, 'x-accel-redirect' - nginx с internal-локациями из
+# SENDFILE_ACCEL_PREFIXES
+SERVE_FILES = True
+SENDFILE_BACKEND = None
+SENDFILE_ACCEL_PREFIXES = {
+    MEDIA_ROOT: '/internal/media/',
+    STATIC_ROOT: '/internal/static/',
+}
+
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 
@@ -145,8 +160,43 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Сколько живёт закэшированная для гостей страница; устаревшей её раньше
+# делает смена поколения любой из её областей (см. posts/middleware.py)
+ANONYMOUS_PAGE_CACHE_TTL = 10 * 60
+
+# Общий для всех процессов кэш - memcached или redis из окружения:
+# SHARED_CACHE_BACKEND=django.core.cache.backends.memcached.PyLibMCCache,
+# SHARED_CACHE_LOCATION=127.0.0.1:11211. Без него при DEBUG берём LocMemCache:
+# он общий только для потоков одного процесса, чего хватает runserver и
+# тестам. В бою с несколькими процессами поколения, блокировки и сброс
+# страниц остались бы внутри одного из них, поэтому без настройки не стартуем.
+# Файловый кэш тоже не подходит: add и incr в нём не атомарны между
+# процессами (см. yatube/cache.py). Перед общим кэшем у каждого процесса свой LRU.
+PROCESS_LOCAL_SHARED_CACHE = not os.environ.get('SHARED_CACHE_BACKEND')
+if not PROCESS_LOCAL_SHARED_CACHE:
+    SHARED_CACHE = {
+        'BACKEND': os.environ['SHARED_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', ''),
+    }
+elif DEBUG:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-shared',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+else:
+    raise ImproperlyConfigured('Задайте общий кэш в SHARED_CACHE_BACKEND и SHARED_CACHE_LOCATION.')
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': SHARED_CACHE,
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            # Поколения, блокировки и записи single_flight - только из общего кэша
+            'SHARED_ONLY_PREFIXES': ['generation:', 'single_flight:', 'lock:'],
+            'ALLOW_PROCESS_LOCAL': PROCESS_LOCAL_SHARED_CACHE,
+        },
     }
 }
@@ -17,7 +17,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf.urls import handler404, handler500
 from django.conf import settings
-from django.conf.urls.static import static
+
+from . import files
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -25,9 +26,11 @@ urlpatterns = [
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    # до posts.urls: иначе "api/" займёт маршрут профиля
+    path("api/", include("posts.api_urls")),
     path("", include("posts.urls")),
     path("about/", include('about.urls', namespace='about'))
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+if settings.SERVE_FILES:
+    urlpatterns += files.serve_urls(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += files.serve_urls(settings.STATIC_URL, document_root=settings.STATIC_ROOT)